@@ -5,18 +5,34 @@ const apiClient = axios.create({
   baseURL: import.meta.env.VITE_API_BASE_URL,
 });
 
+// Read-your-writes: po zapisie (np. upload CV) API zwraca termin, do którego odczyty
+// tej karty mają trafiać na primary zamiast na replikę (skillsense_api/core/database.py).
+// Odsyłamy go w kolejnych żądaniach; po terminie serwer sam go ignoruje.
+const PRIMARY_PIN_HEADER = 'X-Primary-Pin-Until';
+const PRIMARY_PIN_STORAGE_KEY = 'primaryPinUntil';
+
 // Interceptor do dodawania tokenu do każdego żądania
 apiClient.interceptors.request.use((config) => {
   const token = localStorage.getItem('accessToken');
   if (token) {
     config.headers.Authorization = `Bearer ${token}`;
   }
+  const pinnedUntil = sessionStorage.getItem(PRIMARY_PIN_STORAGE_KEY);
+  if (pinnedUntil) {
+    config.headers[PRIMARY_PIN_HEADER] = pinnedUntil;
+  }
   return config;
 });
 
 // NOWY Interceptor do obsługi błędów autoryzacji
 apiClient.interceptors.response.use(
-  (response) => response,
+  (response) => {
+    const pinnedUntil = response.headers[PRIMARY_PIN_HEADER.toLowerCase()];
+    if (pinnedUntil) {
+      sessionStorage.setItem(PRIMARY_PIN_STORAGE_KEY, pinnedUntil);
+    }
+    return response;
+  },
   (error) => {
     if (error.response && error.response.status === 401) {
       // Jeśli token jest nieważny, wyloguj użytkownika
@@ -37,11 +37,13 @@ const DashboardView: React.FC<DashboardViewProps> = ({ setSelectedProfile }) =>
       });
 
       const data = response.data;
+      const summaryMessageId = (Date.now() + 1).toString();
       
       const assistantResponse: Message = { 
-        id: (Date.now() + 1).toString(), 
+        id: summaryMessageId, 
         type: 'assistant', 
-        content: data.summary, 
+        // Bez tokenu podsumowanie nie będzie generowane (np. tryb zdegradowany lub limit czasu)
+        content: data.summary ?? (data.summary_token ? 'Przygotowuję podsumowanie wyników...' : 'Podsumowanie nie jest dostępne dla tego wyszukiwania.'), 
         timestamp: new Date() 
       };
       
@@ -55,6 +57,23 @@ const DashboardView: React.FC<DashboardViewProps> = ({ setSelectedProfile }) =>
 
       setMessages(prev => [...prev, assistantResponse, resultsMessage]);
 
+      // Podsumowanie jest generowane w tle - pobieramy je osobno, wyniki są już widoczne
+      if (!data.summary && data.summary_token) {
+        apiClient.get(`/search/summary/${data.summary_token}`, { params: { wait: true } })
+          .then(({ data: summaryData }) => {
+            const content = summaryData.status === 'ready'
+              ? summaryData.summary
+              : 'Podsumowanie nie jest jeszcze dostępne.';
+            setMessages(prev => prev.map(m => m.id === summaryMessageId ? { ...m, content } : m));
+          })
+          .catch((error) => {
+            // Np. 404 dla wygasłego tokenu - placeholder nie może zostać na zawsze
+            console.error("Błąd pobierania podsumowania:", error);
+            const content = 'Podsumowanie nie jest dostępne dla tego wyszukiwania.';
+            setMessages(prev => prev.map(m => m.id === summaryMessageId ? { ...m, content } : m));
+          });
+      }
+
     } catch (error: any) {
       console.error("Błąd połączenia z API:", error);
       const errorMessage: Message = { 
@@ -1,15 +1,30 @@
 # api.py
+import time
+_import_started = time.perf_counter()
+
+import asyncio
 import os
-from fastapi import FastAPI, Depends, HTTPException, UploadFile, File, Query, status
+from contextlib import asynccontextmanager
+from typing import List, Optional
+from fastapi import FastAPI, Depends, HTTPException, UploadFile, File, Query, Response, status
 from fastapi.security import OAuth2PasswordRequestForm
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse
-from sqlalchemy.ext.asyncio import AsyncSession
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse, StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 
 # Zaktualizowane importy, aby wskazywały na nowe, asynchroniczne moduły
-from core import auth, models, schemas, services, search_logic
-from core.database import engine, get_async_db  # Używamy asynchronicznej zależności
+from core import auth, crud, export, models, schemas, services, search_logic, vector_index
+from core.database import (
+    PRIMARY_PIN_HEADER, dispose_engines, get_async_db, get_async_read_db, get_read_session_factory,
+    mark_recent_write, pool_stats,
+)
 from core.config import settings
+from core.llm_gateway import gateway
+from core.summary_store import summary_store
+from core.readiness import readiness, warm_up
+from core.admission import AdmissionRejected, search_admission
+
+readiness.import_seconds = time.perf_counter() - _import_started
 
 # UWAGA: W środowisku produkcyjnym, tworzenie tabel powinno być zarządzane 
 # przez narzędzia migracji jak Alembic, a nie `create_all`.
@@ -18,7 +33,18 @@ from core.config import settings
 #     async with engine.begin() as conn:
 #         await conn.run_sync(models.Base.metadata.create_all)
 
-app = FastAPI(title=settings.PROJECT_NAME, version=settings.PROJECT_VERSION)
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Rozgrzewanie w tle - worker przyjmuje ruch od razu, stan raportuje /ready
+    warmup_task = asyncio.create_task(warm_up())
+    yield
+    warmup_task.cancel()
+    await vector_index.stop()
+    # Zamyka współdzielone pule połączeń HTTP bramki LLM
+    await gateway.aclose()
+    await dispose_engines()
+
+app = FastAPI(title=settings.PROJECT_NAME, version=settings.PROJECT_VERSION, lifespan=lifespan)
 
 # --- KONFIGURACJA CORS ---
 origins = [
@@ -30,10 +56,31 @@ app.add_middleware(
     CORSMiddleware,
     allow_origins=origins, allow_credentials=True,
     allow_methods=["*"], allow_headers=["*"],
+    # Nagłówek read-your-writes musi być czytelny dla SPA (core/database.py)
+    expose_headers=[PRIMARY_PIN_HEADER],
 )
 
 # --- Endpointy (w pełni asynchroniczne) ---
 
+@app.get("/ready", tags=["Health"])
+async def readiness_probe():
+    """Raportuje, czy proces jest rozgrzany (503, dopóki któryś komponent jest 'cold')."""
+    status_code = status.HTTP_200_OK if readiness.is_warm else status.HTTP_503_SERVICE_UNAVAILABLE
+    return JSONResponse(status_code=status_code, content={
+        **readiness.as_dict(), "search_admission": search_admission.stats(), "db_pools": pool_stats(),
+    })
+
+@app.get("/metrics", response_class=PlainTextResponse, tags=["Health"])
+async def metrics():
+    """Metryki w formacie tekstowym Prometheusa: wykorzystanie pul połączeń z bazą i kolejki /search."""
+    lines = []
+    for engine_name, stats in pool_stats().items():
+        for key, value in stats.items():
+            lines.append(f'skillsense_db_pool_{key}{{engine="{engine_name}"}} {value}')
+    for key, value in search_admission.stats().items():
+        lines.append(f"skillsense_search_admission_{key} {int(value)}")
+    return "\n".join(lines) + "\n"
+
 @app.post("/token", response_model=schemas.Token, tags=["Authentication"])
 async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends()):
     # W asynchronicznej aplikacji, ta logika również powinna być async, 
@@ -49,7 +96,8 @@ async def search_candidates(
     query: str = Query(..., min_length=3, description="Zapytanie w języku naturalnym"),
     skip: int = Query(0, ge=0, description="Liczba profili do pominięcia (offset)"),
     limit: int = Query(10, ge=1, le=50, description="Liczba profili na stronę"),
-    db: AsyncSession = Depends(get_async_db),
+    deadline: Optional[float] = Query(None, gt=0, le=60, description="Budżet czasu zapytania w sekundach (domyślnie SEARCH_DEADLINE_SECONDS)"),
+    db: AsyncSession = Depends(get_async_read_db),
     current_user: str = Depends(auth.get_current_user)
 ):
     """
@@ -62,39 +110,147 @@ async def search_candidates(
     if not query.strip():
         raise HTTPException(status.HTTP_400_BAD_REQUEST, "Query cannot be empty.")
     
+    # Termin liczony od przyjęcia żądania - obejmuje także czas w kolejce
+    request_deadline = search_logic.Deadline(deadline or settings.SEARCH_DEADLINE_SECONDS)
     try:
-        # Wywołanie nowej, perfekcyjnej logiki wyszukiwania
-        return await search_logic.perfected_search_pipeline(
-            db=db, query=query, skip=skip, limit=limit
-        )
+        # Kontrola przyjmowania: limit równoległości, kolejka z terminem, tryb zdegradowany
+        async with search_admission.admit(max_wait=request_deadline.remaining()) as admission:
+            return await search_logic.perfected_search_pipeline(
+                db=db, query=query, skip=skip, limit=limit,
+                degraded=admission.degraded, deadline=request_deadline
+            )
+    except AdmissionRejected as e:
+        code = status.HTTP_429_TOO_MANY_REQUESTS if e.queue_full else status.HTTP_503_SERVICE_UNAVAILABLE
+        raise HTTPException(code, str(e), headers={"Retry-After": str(e.retry_after)})
+    except search_logic.SearchDeadlineExceeded as e:
+        raise HTTPException(status.HTTP_504_GATEWAY_TIMEOUT, str(e))
     except Exception as e:
         # Zaawansowana obsługa błędów
         print(f"Błąd krytyczny w potoku wyszukiwania: {e}")
         raise HTTPException(status.HTTP_500_INTERNAL_SERVER_ERROR, "Wystąpił nieoczekiwany błąd podczas przetwarzania zapytania.")
 
+@app.get("/search/summary/{token}", response_model=schemas.SummaryResponse, tags=["Search"])
+async def get_search_summary(
+    token: str,
+    wait: bool = Query(True, description="Czekaj na wygenerowanie podsumowania (long-polling)"),
+    current_user: str = Depends(auth.get_current_user)
+):
+    """Zwraca podsumowanie wyników wyszukiwania dla tokenu zwróconego przez /search."""
+    status_, summary = await summary_store.resolve(token, wait=wait, timeout=settings.SUMMARY_WAIT_TIMEOUT_SECONDS)
+    if status_ == "unknown":
+        raise HTTPException(status.HTTP_404_NOT_FOUND, "Summary token not found or expired.")
+    return schemas.SummaryResponse(token=token, status=status_, summary=summary)
+
 @app.get("/users", response_model=schemas.PaginatedResponse[schemas.User], tags=["Users"])
 async def read_users(
     skip: int = 0, limit: int = 100, 
-    db: AsyncSession = Depends(get_async_db), 
+    db: AsyncSession = Depends(get_async_read_db), 
     current_user: str = Depends(auth.get_current_user)
 ):
     """Pobiera paginowaną listę wszystkich użytkowników w systemie."""
     users_data = await services.UserService.get_all_users(db, skip=skip, limit=limit)
     return users_data
 
+@app.get("/users/export", tags=["Users"])
+async def export_users(
+    fmt: str = Query("ndjson", alias="format", pattern="^(ndjson|csv)$", description="Format eksportu: ndjson lub csv"),
+    include: Optional[str] = Query(None, description="Relacje do dołączenia, np. 'skills,work_experiences' lub 'all'"),
+    skill: List[str] = Query([], description="Tylko profile z każdą z podanych umiejętności"),
+    project_id: Optional[int] = Query(None, description="Tylko kandydaci z danego projektu rekrutacyjnego"),
+    session_factory: async_sessionmaker = Depends(get_read_session_factory),
+    current_user: str = Depends(auth.get_current_user)
+):
+    """Strumieniowy eksport całej bazy kandydatów (kursor po stronie serwera, stała pamięć)."""
+    try:
+        relations = export.parse_relations(include)
+    except ValueError as e:
+        raise HTTPException(status.HTTP_400_BAD_REQUEST, str(e))
+
+    async def body():
+        # Sesja żyje tak długo, jak wysyłanie odpowiedzi - nie zależy od cyklu życia zależności
+        async with session_factory() as db:
+            async for chunk in export.stream_export(
+                db, fmt, relations, skills=skill, project_id=project_id, batch_size=settings.EXPORT_BATCH_SIZE
+            ):
+                yield chunk
+
+    return StreamingResponse(
+        body(), media_type=export.MEDIA_TYPES[fmt],
+        headers={"Content-Disposition": f'attachment; filename="candidates.{fmt}"'},
+    )
+
+@app.get("/users/{user_id}/similar", response_model=List[schemas.SimilarCandidate], tags=["Users"])
+async def read_similar_users(
+    user_id: int,
+    limit: int = Query(10, ge=1, le=50, description="Liczba zwracanych kandydatów"),
+    skill: List[str] = Query([], description="Tylko kandydaci z każdą z podanych umiejętności"),
+    use_skills: bool = Query(True, description="Łącz podobieństwo embeddingów z pokryciem umiejętności profilu"),
+    db: AsyncSession = Depends(get_async_read_db),
+    current_user: str = Depends(auth.get_current_user)
+):
+    """Kandydaci podobni do wskazanego profilu - bez wywołań LLM (zapisany embedding jako zapytanie)."""
+    return await services.SimilarCandidatesService.find_similar(
+        db, user_id, limit=limit, required_skills=skill, use_skills=use_skills
+    )
+
 @app.post("/upload-cv", response_model=schemas.User, tags=["CV"])
 async def upload_cv(
+    response: Response,
     db: AsyncSession = Depends(get_async_db), 
     file: UploadFile = File(...), 
     current_user: str = Depends(auth.get_current_user)
 ):
     """Przesyła plik CV, przetwarza go i tworzy lub aktualizuje profil kandydata."""
-    return await services.CVService.process_uploaded_cv(db, file, settings.UPLOAD_DIR)
+    user = await services.CVService.process_uploaded_cv(db, file, settings.UPLOAD_DIR)
+    # Kolejne odczyty tego klienta trafiają na primary, dopóki replika nie nadgoni
+    mark_recent_write(response)
+    return user
+
+@app.post("/projects/{project_id}/saved-searches", response_model=schemas.SavedSearch, tags=["Saved Searches"])
+async def create_saved_search(
+    project_id: int,
+    data: schemas.SavedSearchCreate,
+    response: Response,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: str = Depends(auth.get_current_user)
+):
+    """Zapisuje wyszukiwanie dla projektu i jednorazowo ocenia względem niego całą bazę."""
+    saved_search = await services.SavedSearchService.create(db, project_id, data)
+    mark_recent_write(response)
+    return saved_search
+
+@app.get("/projects/{project_id}/saved-searches", response_model=List[schemas.SavedSearch], tags=["Saved Searches"])
+async def list_saved_searches(
+    project_id: int,
+    db: AsyncSession = Depends(get_async_read_db),
+    current_user: str = Depends(auth.get_current_user)
+):
+    return await crud.get_saved_searches_for_project(db, project_id)
+
+@app.post("/saved-searches/{saved_search_id}/run", response_model=schemas.SavedSearchRunResult, tags=["Saved Searches"])
+async def run_saved_search(
+    saved_search_id: int,
+    response: Response,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: str = Depends(auth.get_current_user)
+):
+    """Przyrostowy przebieg: ocenia tylko profile dodane lub zmienione od ostatniego uruchomienia."""
+    run_result = await services.SavedSearchService.run_incremental(db, saved_search_id)
+    mark_recent_write(response)
+    return run_result
+
+@app.get("/saved-searches/{saved_search_id}/results", response_model=List[schemas.SavedSearchResult], tags=["Saved Searches"])
+async def read_saved_search_results(
+    saved_search_id: int,
+    db: AsyncSession = Depends(get_async_read_db),
+    current_user: str = Depends(auth.get_current_user)
+):
+    return await crud.get_saved_search_results(db, saved_search_id)
 
 @app.get("/cv/{user_id}", tags=["CV"])
 async def download_cv(
     user_id: int, 
-    db: AsyncSession = Depends(get_async_db), 
+    db: AsyncSession = Depends(get_async_read_db), 
     current_user: str = Depends(auth.get_current_user)
 ):
     """Pobiera oryginalny plik CV dla danego użytkownika."""
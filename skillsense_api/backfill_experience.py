@@ -0,0 +1,69 @@
+# backfill_experience.py
+import asyncio
+from sqlalchemy import select, text, update
+
+from core.database import engine, AsyncSessionLocal, dispose_engines
+from core import models
+from core.experience import experience_summary
+
+BATCH_SIZE = 1000
+
+async def ensure_column():
+    """Dodaje kolumny doświadczenia i indeks w istniejących bazach (create_all tego nie robi)."""
+    async with engine.begin() as conn:
+        await conn.execute(text("ALTER TABLE users ADD COLUMN IF NOT EXISTS experience_months INTEGER"))
+        await conn.execute(text("CREATE INDEX IF NOT EXISTS ix_users_experience_months ON users (experience_months)"))
+        await conn.execute(text("ALTER TABLE users ADD COLUMN IF NOT EXISTS experience_ongoing_since DATE"))
+
+async def backfill_experience():
+    """
+    Wylicza `users.experience_months` i `users.experience_ongoing_since` dla istniejących
+    profili na podstawie zapisanych stanowisk (work_experience). Wystarczy jednorazowo -
+    trwające etaty są doliczane w chwili zapytania. Dane czytane są strumieniowo (kursor po stronie serwera),
+    a zapisy wykonywane zbiorczo co BATCH_SIZE profili.
+    """
+    print("Rozpoczynam uzupełnianie doświadczenia zawodowego...")
+    await ensure_column()
+
+    stmt = (
+        select(models.WorkExperience.user_id, models.WorkExperience.start_date, models.WorkExperience.end_date)
+        .order_by(models.WorkExperience.user_id)
+        .execution_options(yield_per=BATCH_SIZE * 5)
+    )
+    updated = 0
+    pending = []
+
+    def summary_row(user_id, experiences):
+        experience_months, ongoing_since = experience_summary(experiences)
+        return {"id": user_id, "experience_months": experience_months, "experience_ongoing_since": ongoing_since}
+
+    async def flush(write_db):
+        nonlocal updated, pending
+        await write_db.execute(update(models.User), pending)
+        await write_db.commit()
+        updated += len(pending)
+        pending = []
+        print(f"  Zaktualizowano {updated} profili...")
+
+    async with AsyncSessionLocal() as read_db, AsyncSessionLocal() as write_db:
+        result = await read_db.stream(stmt)
+        current_user_id, experiences = None, []
+        # Wiersze są posortowane po user_id, więc grupujemy je w locie bez wczytywania całości
+        async for row in result:
+            if row.user_id != current_user_id and experiences:
+                pending.append(summary_row(current_user_id, experiences))
+                experiences = []
+                if len(pending) >= BATCH_SIZE:
+                    await flush(write_db)
+            current_user_id = row.user_id
+            experiences.append(row)
+        if experiences:
+            pending.append(summary_row(current_user_id, experiences))
+        if pending:
+            await flush(write_db)
+
+    print(f"Zakończono. Zaktualizowano {updated} profili.")
+    await dispose_engines()
+
+if __name__ == "__main__":
+    asyncio.run(backfill_experience())
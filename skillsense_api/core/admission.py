@@ -0,0 +1,106 @@
+# core/admission.py
+"""
+Kontrola przyjmowania zapytań (admission control) dla /search.
+
+- globalny limit równolegle wykonywanych potoków wyszukiwania,
+- ograniczona kolejka oczekujących z terminem (deadline) oczekiwania - nie dłuższym
+  niż czas pozostały do terminu samego zapytania,
+- odrzucenie z Retry-After, gdy kolejka jest pełna lub termin minął,
+- tryb zdegradowany, gdy kolejka przekracza próg (watermark): potok pomija
+  re-ranking i podsumowanie LLM, a wyniki są zwracane w kolejności RRF.
+"""
+import asyncio
+import math
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import Optional
+
+from .config import settings
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, reason: str, retry_after: int, queue_full: bool):
+        super().__init__(reason)
+        self.retry_after = retry_after
+        self.queue_full = queue_full
+
+
+@dataclass
+class Admission:
+    degraded: bool
+    queued_seconds: float
+
+
+class AdmissionController:
+    def __init__(self, max_concurrent: int, max_queue: int, queue_timeout: float, degrade_watermark: int):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.degrade_watermark = degrade_watermark
+        self._semaphore = asyncio.Semaphore(max_concurrent)
+        self.waiting = 0
+        self.active = 0
+        # Średni czas obsługi (EWMA) - podstawa do wyliczenia Retry-After
+        self._avg_service_seconds = 5.0
+
+    def retry_after(self) -> int:
+        """Szacowany czas do zwolnienia miejsca: kolejka * średni czas obsługi / równoległość."""
+        estimate = (self.waiting + 1) * self._avg_service_seconds / self.max_concurrent
+        return max(1, math.ceil(estimate))
+
+    async def _acquire(self, max_wait: Optional[float] = None) -> bool:
+        """Zajmuje slot; zwraca informację, czy zapytanie ma działać w trybie zdegradowanym."""
+        if not self._semaphore.locked():
+            # Wolny slot - bez kolejkowania (acquire nie zawiesza korutyny)
+            await self._semaphore.acquire()
+            return False
+        if self.waiting >= self.max_queue:
+            raise AdmissionRejected("Search queue is full.", self.retry_after(), queue_full=True)
+
+        # Slot przydzielony po terminie zapytania skończyłby się i tak 504 - lepiej od razu 503
+        timeout = self.queue_timeout if max_wait is None else min(self.queue_timeout, max_wait)
+        if timeout <= 0:
+            raise AdmissionRejected("No time left to wait for a search slot.", self.retry_after(), queue_full=False)
+
+        degraded = self.waiting >= self.degrade_watermark
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), timeout=timeout)
+        except asyncio.TimeoutError:
+            raise AdmissionRejected("Timed out waiting for a search slot.", self.retry_after(), queue_full=False)
+        finally:
+            self.waiting -= 1
+        return degraded
+
+    @asynccontextmanager
+    async def admit(self, max_wait: Optional[float] = None):
+        """`max_wait` - limit oczekiwania w kolejce, np. czas pozostały do terminu zapytania."""
+        queued_at = time.monotonic()
+        degraded = await self._acquire(max_wait)
+
+        self.active += 1
+        started_at = time.monotonic()
+        try:
+            yield Admission(degraded=degraded, queued_seconds=started_at - queued_at)
+        finally:
+            self.active -= 1
+            self._semaphore.release()
+            self._avg_service_seconds = 0.8 * self._avg_service_seconds + 0.2 * (time.monotonic() - started_at)
+
+    def stats(self) -> dict:
+        return {
+            "active": self.active,
+            "waiting": self.waiting,
+            "max_concurrent": self.max_concurrent,
+            "max_queue": self.max_queue,
+            "degraded": self.waiting >= self.degrade_watermark,
+        }
+
+
+search_admission = AdmissionController(
+    max_concurrent=settings.SEARCH_MAX_CONCURRENCY,
+    max_queue=settings.SEARCH_MAX_QUEUE,
+    queue_timeout=settings.SEARCH_QUEUE_TIMEOUT_SECONDS,
+    degrade_watermark=settings.SEARCH_DEGRADE_WATERMARK,
+)
@@ -13,6 +13,19 @@ class Settings:
 
     # Ustawienia Bazy Danych
     DATABASE_URL: str = os.getenv("DATABASE_URL")
+    # Opcjonalna replika tylko do odczytu dla /search i list; brak = odczyty z osobnej puli na primary
+    DATABASE_READ_URL: str = os.getenv("DATABASE_READ_URL")
+    # Pule połączeń (core/database.py) - osobne dla zapisów (upload CV) i odczytów (wyszukiwanie)
+    DB_WRITE_POOL_SIZE: int = int(os.getenv("DB_WRITE_POOL_SIZE", "5"))
+    DB_WRITE_MAX_OVERFLOW: int = int(os.getenv("DB_WRITE_MAX_OVERFLOW", "5"))
+    DB_READ_POOL_SIZE: int = int(os.getenv("DB_READ_POOL_SIZE", "10"))
+    DB_READ_MAX_OVERFLOW: int = int(os.getenv("DB_READ_MAX_OVERFLOW", "10"))
+    DB_POOL_TIMEOUT_SECONDS: float = float(os.getenv("DB_POOL_TIMEOUT_SECONDS", "10"))
+    DB_POOL_RECYCLE_SECONDS: int = int(os.getenv("DB_POOL_RECYCLE_SECONDS", "1800"))
+    # Cache przygotowanych zapytań asyncpg na połączenie; 0 przy PgBouncerze w trybie transakcyjnym
+    DB_STATEMENT_CACHE_SIZE: int = int(os.getenv("DB_STATEMENT_CACHE_SIZE", "100"))
+    # Przez tyle sekund po zapisie odczyty klienta trafiają na primary (read-your-writes)
+    DB_READ_YOUR_WRITES_SECONDS: float = float(os.getenv("DB_READ_YOUR_WRITES_SECONDS", "10"))
 
     # Ustawienia Bezpieczeństwa (JWT)
     SECRET_KEY: str = os.getenv("SECRET_KEY", "super-secret-key-that-should-be-in-env-file")
@@ -24,6 +37,102 @@ class Settings:
     MAX_FILE_SIZE_MB: int = 5
     ALLOWED_FILE_TYPES: list = ["application/pdf"]
 
+    # Ustawienia Bramki LLM (core/llm_gateway.py)
+    # Backend: "openai" (produkcja) lub "stub" (lokalne testy bez wywołań API)
+    LLM_BACKEND: str = os.getenv("LLM_BACKEND", "openai")
+    # Profile modeli - każde wywołanie LLM w aplikacji odwołuje się do profilu, nie do modelu
+    LLM_MODELS: dict = {
+        "query": {"model": "gpt-4o-mini", "temperature": 0.0},
+        "rerank_fast": {"model": "gpt-4o-mini", "temperature": 0.0},
+        "rerank": {"model": "gpt-4o", "temperature": 0.1},
+        "summary": {"model": "gpt-4o", "temperature": 0.3},
+        "cv_extract": {"model": "gpt-4o", "temperature": 0.0},
+        "cv_summary": {"model": "gpt-4o-mini", "temperature": 0.3},
+    }
+    # Początkowy model embeddingów (zapisywany przez init_db.py). Aktywny model trzyma baza
+    # (core/embedding_models.py) - zmienia go wyłącznie `reembed.py --swap`. Kolumny mają 1536 wymiarów.
+    EMBEDDING_MODEL: str = os.getenv("EMBEDDING_MODEL", "text-embedding-ada-002")
+    EMBEDDING_MODELS_CACHE_SECONDS: float = float(os.getenv("EMBEDDING_MODELS_CACHE_SECONDS", "5"))
+    # Limity zapytań na minutę per model (token bucket); brak wpisu = bez limitu
+    LLM_RATE_LIMITS_RPM: dict = {
+        "gpt-4o": int(os.getenv("LLM_RPM_GPT_4O", "500")),
+        "gpt-4o-mini": int(os.getenv("LLM_RPM_GPT_4O_MINI", "1000")),
+    }
+    # Limit dla modelu embeddingów bez własnego wpisu powyżej - dotyczy każdego aktywnego modelu,
+    # także wskazanego w `reembed.py --model`
+    LLM_RPM_EMBEDDINGS: int = int(os.getenv("LLM_RPM_EMBEDDINGS", "3000"))
+    LLM_MAX_RETRIES: int = int(os.getenv("LLM_MAX_RETRIES", "4"))
+    LLM_BACKOFF_BASE_SECONDS: float = 0.5
+    LLM_BACKOFF_MAX_SECONDS: float = 20.0
+    LLM_TIMEOUT_SECONDS: float = float(os.getenv("LLM_TIMEOUT_SECONDS", "60"))
+    # Wspólna pula połączeń HTTP dla wszystkich klientów OpenAI
+    LLM_MAX_CONNECTIONS: int = int(os.getenv("LLM_MAX_CONNECTIONS", "100"))
+    LLM_MAX_KEEPALIVE_CONNECTIONS: int = int(os.getenv("LLM_MAX_KEEPALIVE_CONNECTIONS", "20"))
+
+    # Ustawienia Kaskadowego Re-rankingu (core/search_logic.py)
+    RERANK_SCORE_THRESHOLD: float = 35.0
+    # Ilu najlepszych kandydatów wg taniej oceny w procesie (umiejętności + RRF) trafia dalej
+    RERANK_FIRST_PASS_K: int = int(os.getenv("RERANK_FIRST_PASS_K", "30"))
+    # Czy dodatkowo filtrować pulę przez gpt-4o-mini przed gpt-4o
+    RERANK_CHEAP_LLM_ENABLED: bool = os.getenv("RERANK_CHEAP_LLM_ENABLED", "false").lower() == "true"
+    # Zapas ponad liczbę wyników potrzebnych do wypełnienia strony
+    RERANK_MARGIN: int = int(os.getenv("RERANK_MARGIN", "5"))
+    # Wielkość kolejnych partii, gdy pierwsza nie dała dość wyników powyżej progu
+    RERANK_BATCH_SIZE: int = int(os.getenv("RERANK_BATCH_SIZE", "5"))
+    # Budżet: maksymalna liczba nowych wywołań gpt-4o na jedno zapytanie (oceny z cache się nie liczą)
+    RERANK_MAX_EXPENSIVE_CALLS: int = int(os.getenv("RERANK_MAX_EXPENSIVE_CALLS", "60"))
+    # Cache ocen gpt-4o (core/score_cache.py) - kolejne strony tego samego zapytania ich nie powtarzają
+    RERANK_SCORE_CACHE_TTL_SECONDS: float = float(os.getenv("RERANK_SCORE_CACHE_TTL_SECONDS", "900"))
+    RERANK_SCORE_CACHE_MAX_ENTRIES: int = int(os.getenv("RERANK_SCORE_CACHE_MAX_ENTRIES", "20000"))
+
+    # Ustawienia Kontroli Przyjmowania Zapytań /search (core/admission.py)
+    SEARCH_MAX_CONCURRENCY: int = int(os.getenv("SEARCH_MAX_CONCURRENCY", "8"))
+    SEARCH_MAX_QUEUE: int = int(os.getenv("SEARCH_MAX_QUEUE", "32"))
+    SEARCH_QUEUE_TIMEOUT_SECONDS: float = float(os.getenv("SEARCH_QUEUE_TIMEOUT_SECONDS", "10"))
+    # Od tej długości kolejki nowe zapytania wykonywane są w trybie zdegradowanym (bez LLM re-rankingu)
+    SEARCH_DEGRADE_WATERMARK: int = int(os.getenv("SEARCH_DEGRADE_WATERMARK", "16"))
+
+    # Budżet czasu /search (core/search_logic.py)
+    SEARCH_DEADLINE_SECONDS: float = float(os.getenv("SEARCH_DEADLINE_SECONDS", "8"))
+    SEARCH_DECONSTRUCT_TIMEOUT_SECONDS: float = float(os.getenv("SEARCH_DECONSTRUCT_TIMEOUT_SECONDS", "3"))
+
+    # Ustawienia Indeksu Wektorowego w Pamięci (core/vector_index.py, wymaga numpy)
+    VECTOR_INDEX_ENABLED: bool = os.getenv("VECTOR_INDEX_ENABLED", "false").lower() == "true"
+    # "exact" (dokładne top-k) lub "ivf" (przybliżone, skan nprobe z nlist klastrów)
+    VECTOR_INDEX_MODE: str = os.getenv("VECTOR_INDEX_MODE", "exact")
+    VECTOR_INDEX_NLIST: int = int(os.getenv("VECTOR_INDEX_NLIST", "256"))
+    VECTOR_INDEX_NPROBE: int = int(os.getenv("VECTOR_INDEX_NPROBE", "8"))
+    VECTOR_INDEX_REFRESH_SECONDS: float = float(os.getenv("VECTOR_INDEX_REFRESH_SECONDS", "10"))
+    VECTOR_INDEX_REFRESH_OVERLAP_SECONDS: float = 60.0
+
+    # Ustawienia Zapisanych Wyszukiwań
+    # Ilu najlepszych kandydatów z całej bazy ocenić przy tworzeniu zapisanego wyszukiwania
+    SAVED_SEARCH_INITIAL_LIMIT: int = int(os.getenv("SAVED_SEARCH_INITIAL_LIMIT", "50"))
+    SAVED_SEARCH_BATCH_SIZE: int = 20
+    # Zapas przy przyrostowym przebiegu na profile z transakcji rozpoczętych przed poprzednim przebiegiem,
+    # a zatwierdzonych po nim (updated_at = now() to początek transakcji); ocenione profile są pomijane
+    SAVED_SEARCH_RUN_OVERLAP_SECONDS: float = 60.0
+
+    # Ustawienia Podobnych Kandydatów (/users/{id}/similar, core/similar_cache.py)
+    SIMILAR_CACHE_TTL_SECONDS: float = float(os.getenv("SIMILAR_CACHE_TTL_SECONDS", "600"))
+    SIMILAR_CACHE_MAX_ENTRIES: int = int(os.getenv("SIMILAR_CACHE_MAX_ENTRIES", "2000"))
+    # Ilu sąsiadów wektorowych pobrać na każdy zwracany wynik (zapas na filtr umiejętności i fuzję)
+    SIMILAR_CANDIDATE_POOL_FACTOR: int = 3
+
+    # Ustawienia Eksportu (core/export.py) - liczba profili na partię kursora i fragment odpowiedzi
+    EXPORT_BATCH_SIZE: int = int(os.getenv("EXPORT_BATCH_SIZE", "1000"))
+
+    # Ustawienia Podsumowań Wyszukiwania (core/summary_store.py)
+    SUMMARY_CACHE_MAX_ENTRIES: int = int(os.getenv("SUMMARY_CACHE_MAX_ENTRIES", "1000"))
+    SUMMARY_WAIT_TIMEOUT_SECONDS: float = float(os.getenv("SUMMARY_WAIT_TIMEOUT_SECONDS", "15"))
+    # Podsumowania działają w tle po zwolnieniu slotu /search - mają własny limit równoległości
+    # i kolejkę; przy pełnej kolejce nowe podsumowania są pomijane
+    SUMMARY_MAX_CONCURRENCY: int = int(os.getenv("SUMMARY_MAX_CONCURRENCY", "4"))
+    SUMMARY_MAX_QUEUE: int = int(os.getenv("SUMMARY_MAX_QUEUE", "16"))
+    # Token z innego workera (tabela search_summaries): co ile sprawdzać, czy podsumowanie jest gotowe
+    SUMMARY_POLL_INTERVAL_SECONDS: float = float(os.getenv("SUMMARY_POLL_INTERVAL_SECONDS", "0.5"))
+    SUMMARY_RETENTION_HOURS: int = int(os.getenv("SUMMARY_RETENTION_HOURS", "24"))
+
 settings = Settings()
 
 # Upewnij się, że katalog do uploadu istnieje
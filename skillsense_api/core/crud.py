@@ -1,10 +1,14 @@
 # core/crud.py
-from sqlalchemy import select, func, and_
+from sqlalchemy import select, delete, func, and_, or_, true, exists
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
-from typing import List, Optional, Sequence, Dict
+from typing import AsyncIterator, List, Optional, Sequence, Dict, Tuple
+from datetime import date, datetime, timedelta
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 
-from . import models, schemas
+from . import embedding_models, models, schemas
+from .config import settings
+from .experience import month_index
 
 # --- Domyślne opcje ładowania relacji dla User ---
 # POPRAWKA: Dodanie brakujących relacji, aby dane były zawsze wczytywane
@@ -37,6 +41,15 @@ async def get_user_by_email(db: AsyncSession, email: str) -> Optional[models.Use
     result = await db.execute(stmt)
     return result.scalars().first()
 
+async def get_user_embedding(db: AsyncSession, user_id: int) -> Optional[Tuple[Optional[List[float]], str]]:
+    """(embedding, model embeddingu) profilu - odczytane jedną instrukcją, więc zawsze spójne."""
+    row = (await db.execute(
+        select(models.User.embedding, embedding_models.active_model_column()).filter(models.User.id == user_id)
+    )).first()
+    if row is None:
+        return None
+    return row[0], row[1] or settings.EMBEDDING_MODEL
+
 async def get_all_users(db: AsyncSession, skip: int, limit: int) -> Dict:
     """Asynchronicznie pobiera paginowaną listę wszystkich użytkowników."""
     count_query = select(func.count()).select_from(models.User)
@@ -52,7 +65,7 @@ async def get_all_users(db: AsyncSession, skip: int, limit: int) -> Dict:
     result = await db.execute(query)
     users = result.scalars().all()
     
-    return {"total": total, "page": (skip // limit) + 1, "limit": limit, "items": users}
+    return {"total": total, "page": (skip // limit) + 1, "limit": limit, "items": users, "has_more": skip + limit < total}
 
 
 # --- Funkcje CRUD dla Umiejętności (w pełni asynchroniczne) ---
@@ -74,29 +87,64 @@ async def get_or_create_skill(db: AsyncSession, name: str) -> models.Skill:
 
 # --- Nowe, wyspecjalizowane funkcje wyszukiwania ---
 
-async def vector_search_users(db: AsyncSession, query_embedding: List[float], limit: int = 50) -> Sequence[models.User]:
-    """Asynchronicznie wyszukiwanie wektorowe."""
-    stmt = (
-        select(models.User)
-        .order_by(models.User.embedding.l2_distance(query_embedding))
-        .limit(limit)
+def experience_at_least(min_experience_months: int):
+    """
+    Filtr SQL łącznego doświadczenia na dziś: zakończone okresy plus miesiące trwającego etatu
+    (jak `experience.effective_experience_months`). Profile bez odczytanych dat (NULL) nie są
+    odrzucane - ocenia je dopiero LLM.
+    """
+    since = models.User.experience_ongoing_since
+    ongoing_months = func.coalesce(
+        month_index(date.today()) + 1 - (func.extract("year", since) * 12 + func.extract("month", since) - 1), 0
+    )
+    return or_(
+        models.User.experience_months.is_(None),
+        models.User.experience_months >= min_experience_months,
+        models.User.experience_months + ongoing_months >= min_experience_months,
     )
+
+async def vector_search_user_ids(
+    db: AsyncSession, query_embedding: List[float], limit: int = 50,
+    min_experience_months: Optional[int] = None, exclude_user_id: Optional[int] = None,
+    embedding_model: Optional[str] = None
+) -> List[int]:
+    """
+    Asynchronicznie wyszukiwanie wektorowe - tylko ID w kolejności odległości; profile
+    pobiera potem `get_users_by_ids_with_filters` (bez wektorów i relacji w tym zapytaniu).
+    `embedding_model` (model wektora zapytania) jest sprawdzany w tej samej instrukcji -
+    po zamianie kolumn wynik jest pusty zamiast mieszany.
+    """
+    stmt = select(models.User.id)
+    if embedding_model is not None:
+        stmt = stmt.filter(embedding_models.active_model_is(embedding_model))
+    if min_experience_months:
+        stmt = stmt.filter(experience_at_least(min_experience_months))
+    if exclude_user_id is not None:
+        stmt = stmt.filter(models.User.id != exclude_user_id)
+    stmt = stmt.order_by(models.User.embedding.l2_distance(query_embedding)).limit(limit)
     result = await db.execute(stmt)
-    return result.scalars().all()
+    return list(result.scalars().all())
 
-async def full_text_search_users(db: AsyncSession, query_text: str, limit: int = 50) -> Sequence[models.User]:
+async def full_text_search_users(
+    db: AsyncSession, query_text: str, limit: int = 50,
+    min_experience_months: Optional[int] = None
+) -> Sequence[models.User]:
     """Asynchroniczne wyszukiwanie pełnotekstowe z użyciem tsvector."""
     if not query_text or not query_text.strip():
         return []
         
-    ts_query_text = " & ".join(query_text.strip().split())
-    
+    # Zapytanie FTS liczone raz (CTE) i używane zarówno w filtrze (indeks GIN), jak i w rankingu.
+    # ts_rank_cd uwzględnia wagi tsvectora: umiejętności (A) > stanowiska (B) > opisy (C).
+    ts_query = select(func.plainto_tsquery('english', query_text.strip()).label("query")).cte("ts_query")
     stmt = (
         select(models.User)
-        .filter(models.User.tsvector_col.match(ts_query_text, postgresql_regconfig='english'))
-        .order_by(func.ts_rank(models.User.tsvector_col, func.to_tsquery('english', ts_query_text)).desc())
+        .join(ts_query, true())
+        .filter(models.User.tsvector_col.op("@@")(ts_query.c.query))
+        .order_by(func.ts_rank_cd(models.User.tsvector_col, ts_query.c.query).desc())
         .limit(limit)
     )
+    if min_experience_months:
+        stmt = stmt.filter(experience_at_least(min_experience_months))
     result = await db.execute(stmt)
     return result.scalars().all()
 
@@ -124,3 +172,144 @@ async def get_users_by_ids_with_filters(
     sorted_results = [results_map[id] for id in user_ids if id in results_map]
     
     return sorted_results
+
+
+async def stream_users_updated_since(
+    db: AsyncSession,
+    since: Optional[datetime],
+    required_skills: Optional[List[str]] = None,
+    min_experience_months: Optional[int] = None,
+    unscored_for_saved_search_id: Optional[int] = None,
+    batch_size: int = 20,
+) -> AsyncIterator[Sequence[models.User]]:
+    """
+    Profile dodane lub zmienione po `since`, wstępnie przefiltrowane jak w wyszukiwaniu hybrydowym,
+    czytane strumieniowo (kursor po stronie serwera) partiami po `batch_size`.
+    `unscored_for_saved_search_id` pomija profile, których bieżąca wersja (cv_file_hash)
+    była już oceniona względem danego zapisanego wyszukiwania.
+    """
+    stmt = (
+        select(models.User)
+        .options(*DEFAULT_USER_LOADER_OPTIONS)
+        .order_by(models.User.id)
+        .execution_options(yield_per=batch_size)
+    )
+    if since is not None:
+        stmt = stmt.filter(models.User.updated_at > since)
+    if min_experience_months:
+        stmt = stmt.filter(experience_at_least(min_experience_months))
+    for skill in required_skills or []:
+        stmt = stmt.filter(models.User.skills.any(models.Skill.name.ilike(skill)))
+    if unscored_for_saved_search_id is not None:
+        result_model = models.SavedSearchResult
+        stmt = stmt.filter(~exists().where(
+            result_model.saved_search_id == unscored_for_saved_search_id,
+            result_model.user_id == models.User.id,
+            result_model.profile_version.is_not_distinct_from(models.User.cv_file_hash),
+        ))
+    result = await db.stream(stmt)
+    async for partition in result.scalars().partitions(batch_size):
+        yield partition
+
+# --- Funkcje CRUD dla Zapisanych Wyszukiwań ---
+
+async def db_now(db: AsyncSession) -> datetime:
+    """Czas bazy (początek bieżącej transakcji) - ten sam zegar co `updated_at` ustawiane przez now()."""
+    return (await db.execute(select(func.now()))).scalar_one()
+
+async def get_active_saved_searches(db: AsyncSession) -> Sequence[models.SavedSearch]:
+    result = await db.execute(select(models.SavedSearch).filter(models.SavedSearch.is_active.is_(True)))
+    return result.scalars().all()
+
+async def get_saved_searches_for_project(db: AsyncSession, project_id: int) -> Sequence[models.SavedSearch]:
+    result = await db.execute(
+        select(models.SavedSearch)
+        .filter(models.SavedSearch.project_id == project_id)
+        .order_by(models.SavedSearch.created_at.desc())
+    )
+    return result.scalars().all()
+
+async def get_saved_search_results(db: AsyncSession, saved_search_id: int) -> Sequence[models.SavedSearchResult]:
+    result = await db.execute(
+        select(models.SavedSearchResult)
+        .filter(models.SavedSearchResult.saved_search_id == saved_search_id)
+        .order_by(models.SavedSearchResult.match_score.desc())
+    )
+    return result.scalars().all()
+
+async def get_scored_profile_versions(db: AsyncSession, user_id: int) -> Dict[int, Optional[str]]:
+    """Mapa saved_search_id -> wersja profilu (cv_file_hash), dla której profil był już oceniony."""
+    result = await db.execute(
+        select(models.SavedSearchResult.saved_search_id, models.SavedSearchResult.profile_version)
+        .filter(models.SavedSearchResult.user_id == user_id)
+    )
+    return {row.saved_search_id: row.profile_version for row in result}
+
+async def upsert_saved_search_results(db: AsyncSession, saved_search: models.SavedSearch, scored: List[Dict]) -> int:
+    """
+    Zapisuje oceny profili i dodaje kandydatów powyżej progu do `project_candidates`
+    (istniejących kandydatów projektu nie zmienia). Zwraca liczbę zakwalifikowanych.
+    """
+    if not scored:
+        return 0
+    rows = [{
+        "saved_search_id": saved_search.id,
+        "user_id": item["profile"].id,
+        "match_score": item["match_score"],
+        "reasoning": item["reasoning"],
+        "profile_version": item["profile"].cv_file_hash,
+    } for item in scored]
+    stmt = pg_insert(models.SavedSearchResult).values(rows)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["saved_search_id", "user_id"],
+        set_={
+            "match_score": stmt.excluded.match_score,
+            "reasoning": stmt.excluded.reasoning,
+            "profile_version": stmt.excluded.profile_version,
+            "scored_at": func.now(),
+        },
+    )
+    await db.execute(stmt)
+
+    qualified = [row["user_id"] for row in rows if row["match_score"] > saved_search.min_score]
+    if qualified:
+        await db.execute(
+            pg_insert(models.project_candidates_table)
+            .values([{"project_id": saved_search.project_id, "user_id": uid,
+                      "status": models.CandidateStatusEnum.new} for uid in qualified])
+            .on_conflict_do_nothing()
+        )
+    return len(qualified)
+
+
+# --- Funkcje CRUD dla Podsumowań Wyszukiwania ---
+
+async def save_search_summary(db: AsyncSession, token: str, summary: Optional[str]):
+    """
+    Zapisuje podsumowanie dla tokenu; `summary=None` oznacza generowanie w toku
+    i nie nadpisuje podsumowania zapisanego już przez inny worker.
+    """
+    stmt = pg_insert(models.SearchSummary).values(token=token, summary=summary)
+    if summary is None:
+        stmt = stmt.on_conflict_do_nothing(index_elements=[models.SearchSummary.token])
+    else:
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[models.SearchSummary.token], set_={"summary": summary, "created_at": func.now()}
+        )
+    await db.execute(stmt)
+
+async def get_search_summary(db: AsyncSession, token: str) -> Optional[models.SearchSummary]:
+    return (await db.execute(select(models.SearchSummary).where(models.SearchSummary.token == token))).scalar_one_or_none()
+
+async def delete_pending_search_summary(db: AsyncSession, token: str):
+    """Usuwa znacznik generowania po nieudanym zadaniu - token przestaje być znany."""
+    await db.execute(
+        delete(models.SearchSummary)
+        .where(models.SearchSummary.token == token, models.SearchSummary.summary.is_(None))
+    )
+
+async def purge_search_summaries(db: AsyncSession, older_than_hours: int):
+    await db.execute(
+        delete(models.SearchSummary)
+        .where(models.SearchSummary.created_at < func.now() - timedelta(hours=older_than_hours))
+    )
@@ -1,16 +1,13 @@
 # core/cv_parser.py
 import os
 import re
-from langchain_openai import ChatOpenAI
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import StrOutputParser
 from pydantic import BaseModel, Field
 from typing import List, Optional, Dict
-from unstructured.partition.pdf import partition_pdf
 import json
 
-llm = ChatOpenAI(model="gpt-4o", temperature=0.0)
-summary_llm = ChatOpenAI(model="gpt-4o-mini", temperature=0.3)
+from .llm_gateway import gateway
 
 # --- Schematy Pydantic (bez zmian) ---
 class PersonalInfo(BaseModel): name: Optional[str] = None; email: Optional[str] = None; phone: Optional[str] = None; linkedin: Optional[str] = None; github: Optional[str] = None
@@ -36,6 +33,9 @@ class FullCVData(BaseModel):
 def parse_cv_file(file_path: str) -> dict:
     print("\n--- OSTATECZNY, NIEZAWODNY PROCES PARSOWANIA v3 ---")
     
+    # Import leniwy: unstructured ciągnie za sobą ciężki stos ML, potrzebny wyłącznie przy uploadzie CV
+    from unstructured.partition.pdf import partition_pdf
+
     try:
         elements = partition_pdf(filename=file_path, strategy="hi_res", infer_table_structure=True)
         text = "\n\n".join([str(el) for el in elements])
@@ -56,7 +56,7 @@ def parse_cv_file(file_path: str) -> dict:
         ("human", "Przeanalizuj poniższy tekst z CV i wyekstrahuj z niego wszystkie dane zgodnie z podanym schematem:\n\n---\n{cv_text}\n---")
     ])
     
-    chain = prompt | llm.with_structured_output(FullCVData)
+    chain = prompt | gateway.chat("cv_extract", schema=FullCVData)
     
     print("2. Wysyłam pełny tekst CV do AI w celu kompletnej ekstrakcji...")
     structured_output = chain.invoke({"cv_text": text})
@@ -67,7 +67,7 @@ def parse_cv_file(file_path: str) -> dict:
     parsed_data['projects'] = parsed_data.pop('projects_and_achievements')
     
     summary_prompt = ChatPromptTemplate.from_template("Napisz profesjonalne podsumowanie kandydata (3-4 zdania) na podstawie danych.\nDANE:\n{data}")
-    summary_chain = summary_prompt | summary_llm | StrOutputParser()
+    summary_chain = summary_prompt | gateway.chat("cv_summary") | StrOutputParser()
     parsed_data['ai_summary'] = summary_chain.invoke({"data": json.dumps(parsed_data, indent=2, ensure_ascii=False)})
     print("4. Wygenerowano podsumowanie AI.")
 
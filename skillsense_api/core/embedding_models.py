@@ -0,0 +1,93 @@
+# core/embedding_models.py
+"""
+Aktywny model embeddingów. Źródłem prawdy jest tabela `embedding_models`, a nie
+EMBEDDING_MODEL z konfiguracji (ta służy tylko jako wartość początkowa dla init_db.py).
+
+`reembed.py --swap` zamienia kolumny i zmienia `active_model` w jednej transakcji, więc
+z punktu widzenia API zamiana jest atomowa:
+- zapytania wektorowe do bazy sprawdzają model w tej samej instrukcji (`active_model_is`) -
+  wektor zapytania nigdy nie jest porównywany z wektorami innego modelu, także na workerze
+  z nieaktualnym cache; pusty wynik jest wtedy powtarzany z odświeżonym modelem,
+- zapis profilu blokuje wiersz (`lock_for_profile_write`), a podczas przeliczania liczy
+  wektory obu modeli (`embed_profile`) - wgrane w tym czasie CV nie wymagają poprawek.
+
+Odczyt jest cache'owany w procesie przez EMBEDDING_MODELS_CACHE_SECONDS.
+"""
+import asyncio
+import time
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+from sqlalchemy import exists, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import models
+from .config import settings
+from .llm_gateway import gateway
+
+STATE_ID = 1
+
+
+@dataclass(frozen=True)
+class EmbeddingModelState:
+    active: str
+    shadow: Optional[str] = None
+
+
+_cached: Optional[EmbeddingModelState] = None
+_cached_at = 0.0
+
+
+def _remember(state: EmbeddingModelState) -> EmbeddingModelState:
+    global _cached, _cached_at
+    _cached, _cached_at = state, time.monotonic()
+    return state
+
+
+def _state_query():
+    table = models.EmbeddingModels
+    return select(table.active_model, table.shadow_model).where(table.id == STATE_ID)
+
+
+def _from_row(row) -> EmbeddingModelState:
+    # Baza bez wiersza (init_db.py jeszcze nie uruchomiony) - model z konfiguracji
+    if row is None:
+        return EmbeddingModelState(active=settings.EMBEDDING_MODEL)
+    return EmbeddingModelState(active=row.active_model, shadow=row.shadow_model)
+
+
+async def current(db: AsyncSession, refresh: bool = False) -> EmbeddingModelState:
+    """Modele kolumn `embedding` i `embedding_shadow` (z cache procesu, o ile nie `refresh`)."""
+    if not refresh and _cached is not None and time.monotonic() - _cached_at < settings.EMBEDDING_MODELS_CACHE_SECONDS:
+        return _cached
+    return _remember(_from_row((await db.execute(_state_query())).first()))
+
+
+async def lock_for_profile_write(db: AsyncSession) -> EmbeddingModelState:
+    """Blokada współdzielona do końca transakcji - zamiana kolumn czeka na zapisywane profile."""
+    return _remember(_from_row((await db.execute(_state_query().with_for_update(read=True))).first()))
+
+
+def active_model_is(model: str):
+    """Warunek SQL: `users.embedding` zawiera wektory modelu `model`."""
+    table = models.EmbeddingModels
+    condition = exists().where(table.id == STATE_ID, table.active_model == model)
+    if model == settings.EMBEDDING_MODEL:
+        condition = or_(condition, ~exists().where(table.id == STATE_ID))
+    return condition
+
+
+def active_model_column():
+    """Aktywny model jako podzapytanie skalarne - do odczytu wektorów razem z ich modelem."""
+    table = models.EmbeddingModels
+    return select(table.active_model).where(table.id == STATE_ID).scalar_subquery()
+
+
+async def embed_profile(text: str, state: EmbeddingModelState) -> Tuple[List[float], Optional[List[float]]]:
+    """Wektory profilu dla `embedding` i - podczas przeliczania - `embedding_shadow`."""
+    if state.shadow is None:
+        return await gateway.aembed_query(text, state.active), None
+    active, shadow = await asyncio.gather(
+        gateway.aembed_query(text, state.active), gateway.aembed_query(text, state.shadow)
+    )
+    return active, shadow
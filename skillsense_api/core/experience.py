@@ -0,0 +1,127 @@
+# core/experience.py
+"""
+Wyliczanie łącznego doświadczenia zawodowego (w miesiącach) z dat stanowisk.
+
+Daty pochodzą z ekstrakcji LLM, więc formaty są różne: "2021-03", "03.2021", "03/2021",
+"marzec 2021", "Mar 2021", "2021", "obecnie"/"present". Nakładające się okresy
+(np. dwa równoległe etaty) są scalane, aby nie liczyć tych samych miesięcy podwójnie.
+
+Trwający etat rośnie z każdym miesiącem, więc w bazie zapisywane są osobno miesiące
+zakończonych okresów (`users.experience_months`) i początek trwającego okresu
+(`users.experience_ongoing_since`) - łączne doświadczenie liczone jest w chwili zapytania.
+"""
+import re
+from datetime import date
+from typing import Any, Iterable, List, Optional, Tuple
+
+PRESENT_MARKERS = ("present", "current", "currently", "now", "ongoing", "obecnie", "teraz", "nadal", "aktualnie",
+                   "do dziś", "do dzis")
+# Całe słowa - "unknown" zawiera "now", ale nie oznacza trwającego etatu
+_PRESENT_RE = re.compile(r"\b(?:" + "|".join(re.escape(marker) for marker in PRESENT_MARKERS) + r")\b")
+
+MONTH_NAMES = {
+    "jan": 1, "sty": 1, "feb": 2, "lut": 2, "mar": 3, "apr": 4, "kwi": 4, "may": 5, "maj": 5,
+    "jun": 6, "cze": 6, "jul": 7, "lip": 7, "aug": 8, "sie": 8, "sep": 9, "wrz": 9,
+    "oct": 10, "paź": 10, "paz": 10, "nov": 11, "lis": 11, "dec": 12, "gru": 12,
+}
+
+_YEAR_RE = re.compile(r"(19|20)\d{2}")
+_NUMERIC_RE = [
+    re.compile(r"(?P<y>(?:19|20)\d{2})[-./](?P<m>\d{1,2})"),  # 2021-03, 2021.03
+    re.compile(r"(?P<m>\d{1,2})[-./](?P<y>(?:19|20)\d{2})"),  # 03.2021, 03/2021
+]
+
+
+def month_index(value: date) -> int:
+    return value.year * 12 + (value.month - 1)
+
+
+def month_start(index: int) -> date:
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def parse_cv_date(value: Optional[str], is_end: bool = False, today: Optional[date] = None) -> Optional[int]:
+    """
+    Zamienia datę z CV na indeks miesiąca (rok * 12 + miesiąc - 1).
+    Dla samego roku przyjmuje styczeń (początek) lub grudzień (koniec okresu).
+    """
+    today = today or date.today()
+    if not value or not value.strip():
+        return month_index(today) if is_end else None
+    text = value.strip().lower()
+    if _PRESENT_RE.search(text):
+        return month_index(today)
+
+    for pattern in _NUMERIC_RE:
+        match = pattern.search(text)
+        if match and 1 <= int(match.group("m")) <= 12:
+            return int(match.group("y")) * 12 + int(match.group("m")) - 1
+
+    year_match = _YEAR_RE.search(text)
+    if not year_match:
+        return None
+    year = int(year_match.group(0))
+    for prefix, month in MONTH_NAMES.items():
+        if re.search(rf"\b{prefix}", text):
+            return year * 12 + month - 1
+    return year * 12 + (11 if is_end else 0)
+
+
+def item_field(item: Any, name: str) -> Any:
+    """Pole słownika z parsera CV lub atrybut obiektu ORM (używane także w core/services.py)."""
+    return item.get(name) if isinstance(item, dict) else getattr(item, name, None)
+
+
+def experience_summary(work_experiences: Iterable[Any], today: Optional[date] = None) -> Tuple[Optional[int], Optional[date]]:
+    """
+    (miesiące zakończonych okresów, początek trwającego okresu) ze scalonych okresów zatrudnienia.
+    Okres trwa, jeśli kończy się w bieżącym miesiącu lub później ("obecnie", brak daty końcowej).
+    Akceptuje słowniki z parsera CV lub obiekty `models.WorkExperience`.
+    Zwraca (None, None), jeśli żadnego okresu nie udało się odczytać.
+    """
+    today = today or date.today()
+    current = month_index(today)
+    intervals: List[Tuple[int, int]] = []
+    for item in work_experiences or []:
+        if not item:
+            continue
+        start = parse_cv_date(item_field(item, "start_date"), today=today)
+        # Brak daty końcowej przy znanej dacie początkowej traktujemy jak "obecnie"
+        end = parse_cv_date(item_field(item, "end_date"), is_end=True, today=today)
+        if start is None or end is None:
+            continue
+        start, end = min(start, current), min(end, current)
+        if end >= start:
+            intervals.append((start, end))
+
+    if not intervals:
+        return None, None
+
+    intervals.sort()
+    merged = [list(intervals[0])]
+    for start, end in intervals[1:]:
+        if start <= merged[-1][1] + 1:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    ongoing_since = None
+    if merged[-1][1] == current:
+        ongoing_since = month_start(merged.pop()[0])
+    return sum(end - start + 1 for start, end in merged), ongoing_since
+
+
+def effective_experience_months(
+    closed_months: Optional[int], ongoing_since: Optional[date], today: Optional[date] = None
+) -> Optional[int]:
+    """Łączne doświadczenie na dziś: zakończone okresy plus miesiące trwającego okresu (z bieżącym)."""
+    if closed_months is None:
+        return None
+    if ongoing_since is None:
+        return closed_months
+    return closed_months + month_index(today or date.today()) - month_index(ongoing_since) + 1
+
+
+def total_experience_months(work_experiences: Iterable[Any], today: Optional[date] = None) -> Optional[int]:
+    """Łączna liczba miesięcy doświadczenia na dzień `today` (None, jeśli brak odczytanych okresów)."""
+    closed_months, ongoing_since = experience_summary(work_experiences, today)
+    return effective_experience_months(closed_months, ongoing_since, today)
@@ -0,0 +1,138 @@
+# core/export.py
+"""
+Strumieniowy eksport bazy kandydatów (NDJSON lub CSV).
+
+Profile czytane są kursorem po stronie serwera partiami po `yield_per`, a relacje
+dociągane jednym zapytaniem `selectin` na partię - wyłącznie te wybrane przez wywołującego.
+Każda partia jest od razu formatowana i oddawana jako fragment odpowiedzi, więc zużycie
+pamięci nie zależy od wielkości bazy. Wspólne dla endpointu /users/export i `export_users.py`.
+"""
+import csv
+import io
+import json
+from typing import AsyncIterator, Callable, Dict, List, Optional, Sequence
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import load_only, raiseload, selectinload
+
+from . import models, schemas
+
+EXPORT_FORMATS = ("ndjson", "csv")
+MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+# Kolumny skalarne profilu (bez embeddingów i tsvectora)
+EXPORT_COLUMNS = (
+    "id", "email", "name", "surname", "phone", "linkedin_url", "github_url",
+    "ai_summary", "experience_months", "experience_ongoing_since", "updated_at", "other_data",
+)
+
+# Relacje, które można dołączyć do eksportu: nazwa -> (relacja ORM, schemat)
+EXPORT_RELATIONS = {
+    "skills": (models.User.skills, schemas.Skill),
+    "work_experiences": (models.User.work_experiences, schemas.WorkExperience),
+    "education_history": (models.User.education_history, schemas.Education),
+    "projects": (models.User.projects, schemas.Project),
+    "languages": (models.User.languages, schemas.Language),
+    "publications": (models.User.publications, schemas.Publication),
+    "certifications": (models.User.certifications, schemas.Certification),
+}
+
+
+def parse_relations(include: Optional[str]) -> List[str]:
+    """'skills,projects' -> ['skills', 'projects']; 'all' -> wszystkie relacje."""
+    if not include:
+        return []
+    names = [name.strip() for name in include.split(",") if name.strip()]
+    if names == ["all"]:
+        return list(EXPORT_RELATIONS)
+    unknown = [name for name in names if name not in EXPORT_RELATIONS]
+    if unknown:
+        raise ValueError(f"Unknown relations: {', '.join(unknown)}. Allowed: {', '.join(EXPORT_RELATIONS)}, all.")
+    return names
+
+
+def build_export_query(
+    relations: Sequence[str],
+    skills: Optional[Sequence[str]] = None,
+    project_id: Optional[int] = None,
+    batch_size: int = 1000,
+):
+    stmt = (
+        select(models.User)
+        .options(
+            load_only(*(getattr(models.User, column) for column in EXPORT_COLUMNS)),
+            *(selectinload(EXPORT_RELATIONS[name][0]) for name in relations),
+            # Relacje mają domyślnie lazy="selectin" - bez tego ładowałyby się wszystkie
+            raiseload("*"),
+        )
+        .order_by(models.User.id)
+        .execution_options(yield_per=batch_size)
+    )
+    for skill in skills or []:
+        stmt = stmt.filter(models.User.skills.any(models.Skill.name.ilike(skill)))
+    if project_id is not None:
+        candidates = models.project_candidates_table
+        stmt = stmt.filter(models.User.id.in_(
+            select(candidates.c.user_id).where(candidates.c.project_id == project_id)
+        ))
+    return stmt
+
+
+def _serialize(user: models.User, relations: Sequence[str]) -> Dict:
+    row = {column: getattr(user, column) for column in EXPORT_COLUMNS}
+    for column in ("updated_at", "experience_ongoing_since"):
+        row[column] = row[column].isoformat() if row[column] else None
+    for name in relations:
+        schema = EXPORT_RELATIONS[name][1]
+        row[name] = [schema.model_validate(item).model_dump(mode="json") for item in getattr(user, name)]
+    return row
+
+
+def _format_ndjson(rows: List[Dict], relations: Sequence[str], header: bool) -> str:
+    return "".join(json.dumps(row, ensure_ascii=False) + "\n" for row in rows)
+
+
+def _format_csv(rows: List[Dict], relations: Sequence[str], header: bool) -> str:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if header:
+        writer.writerow([*EXPORT_COLUMNS, *relations])
+    for row in rows:
+        values = [row[column] for column in EXPORT_COLUMNS]
+        values[EXPORT_COLUMNS.index("other_data")] = json.dumps(row["other_data"], ensure_ascii=False) if row["other_data"] is not None else ""
+        for name in relations:
+            if name == "skills":
+                values.append("; ".join(skill["name"] for skill in row[name]))
+            else:
+                values.append(json.dumps(row[name], ensure_ascii=False))
+        writer.writerow(values)
+    return buffer.getvalue()
+
+
+FORMATTERS: Dict[str, Callable[[List[Dict], Sequence[str], bool], str]] = {
+    "ndjson": _format_ndjson,
+    "csv": _format_csv,
+}
+
+
+async def stream_export(
+    db: AsyncSession,
+    fmt: str,
+    relations: Sequence[str],
+    skills: Optional[Sequence[str]] = None,
+    project_id: Optional[int] = None,
+    batch_size: int = 1000,
+) -> AsyncIterator[str]:
+    """Zwraca kolejne fragmenty pliku eksportu - jeden na partię `batch_size` profili."""
+    formatter = FORMATTERS[fmt]
+    stmt = build_export_query(relations, skills=skills, project_id=project_id, batch_size=batch_size)
+    result = await db.stream(stmt)
+    first = True
+    async for partition in result.scalars().partitions(batch_size):
+        yield formatter([_serialize(user, relations) for user in partition], relations, first)
+        first = False
+        # Obiekty z poprzedniej partii nie są już potrzebne - nie trzymamy ich w mapie tożsamości
+        db.expunge_all()
+    if first and fmt == "csv":
+        yield formatter([], relations, True)
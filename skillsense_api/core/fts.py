@@ -0,0 +1,117 @@
+# core/fts.py
+"""
+Ważony tsvector utrzymywany przez Postgresa (funkcja + triggery).
+
+`users.tsvector_col` jest przeliczany w bazie przy każdej zmianie profilu lub jego relacji:
+- waga A: umiejętności (skills) i technologie ze stanowisk,
+- waga B: stanowiska, firmy i nazwy projektów,
+- waga C: podsumowanie AI oraz opisy stanowisk i projektów.
+
+Kolumna generowana nie może odwoływać się do innych tabel, dlatego używamy triggerów.
+Aplikacja nie wysyła już tekstu do FTS - wystarczy zapis relacji.
+"""
+from sqlalchemy import text
+
+BUILD_TSVECTOR_FUNCTION = """
+CREATE OR REPLACE FUNCTION users_build_tsvector(uid integer, summary text) RETURNS tsvector AS $$
+    SELECT
+        setweight(to_tsvector('english', coalesce((
+            SELECT string_agg(s.name, ' ')
+            FROM user_skills us JOIN skills s ON s.id = us.skill_id
+            WHERE us.user_id = uid
+        ), '') || ' ' || coalesce((
+            SELECT string_agg(t.value, ' ')
+            FROM work_experience w, json_array_elements_text(
+                CASE WHEN json_typeof(w.technologies_used) = 'array' THEN w.technologies_used ELSE '[]'::json END
+            ) AS t(value)
+            WHERE w.user_id = uid
+        ), '')), 'A') ||
+        setweight(to_tsvector('english', coalesce((
+            SELECT string_agg(coalesce(w.position, '') || ' ' || coalesce(w.company, ''), ' ')
+            FROM work_experience w WHERE w.user_id = uid
+        ), '') || ' ' || coalesce((
+            SELECT string_agg(p.name, ' ') FROM projects p WHERE p.user_id = uid
+        ), '')), 'B') ||
+        setweight(to_tsvector('english', coalesce(summary, '') || ' ' || coalesce((
+            SELECT string_agg(w.description, ' ') FROM work_experience w WHERE w.user_id = uid
+        ), '') || ' ' || coalesce((
+            SELECT string_agg(p.description, ' ') FROM projects p WHERE p.user_id = uid
+        ), '')), 'C')
+$$ LANGUAGE sql STABLE;
+"""
+
+USERS_TRIGGER_FUNCTION = """
+CREATE OR REPLACE FUNCTION users_tsvector_self_trigger() RETURNS trigger AS $$
+BEGIN
+    NEW.tsvector_col := users_build_tsvector(NEW.id, NEW.ai_summary);
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+"""
+
+# Trigger na poziomie instrukcji z tabelami przejściowymi (transition tables): tsvector każdego
+# dotkniętego profilu jest przeliczany raz na instrukcję, a nie raz na każdy wstawiony/usunięty wiersz.
+# Postgres nie pozwala na tabele przejściowe w triggerze z kilkoma zdarzeniami, stąd osobny
+# trigger na INSERT, UPDATE i DELETE (wspólna funkcja; plpgsql rozwiązuje nazwy tabel
+# dopiero przy wykonaniu danej gałęzi).
+RELATION_TRIGGER_FUNCTION = """
+CREATE OR REPLACE FUNCTION users_tsvector_relation_trigger() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        UPDATE users SET tsvector_col = users_build_tsvector(id, ai_summary)
+        WHERE id IN (SELECT DISTINCT user_id FROM new_rows);
+    ELSIF TG_OP = 'DELETE' THEN
+        UPDATE users SET tsvector_col = users_build_tsvector(id, ai_summary)
+        WHERE id IN (SELECT DISTINCT user_id FROM old_rows);
+    ELSE
+        UPDATE users SET tsvector_col = users_build_tsvector(id, ai_summary)
+        WHERE id IN (SELECT user_id FROM old_rows UNION SELECT user_id FROM new_rows);
+    END IF;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+"""
+
+# Tabele relacji, których zmiana wpływa na tsvector profilu
+RELATION_TABLES = ("user_skills", "work_experience", "projects")
+
+# Zdarzenie -> deklaracja tabel przejściowych
+RELATION_TRIGGER_EVENTS = {
+    "insert": "REFERENCING NEW TABLE AS new_rows",
+    "update": "REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows",
+    "delete": "REFERENCING OLD TABLE AS old_rows",
+}
+
+
+def trigger_statements() -> list:
+    statements = [
+        BUILD_TSVECTOR_FUNCTION,
+        USERS_TRIGGER_FUNCTION,
+        RELATION_TRIGGER_FUNCTION,
+        "DROP TRIGGER IF EXISTS users_tsvector_self ON users",
+        """CREATE TRIGGER users_tsvector_self BEFORE INSERT OR UPDATE OF ai_summary ON users
+           FOR EACH ROW EXECUTE FUNCTION users_tsvector_self_trigger()""",
+    ]
+    for table in RELATION_TABLES:
+        # Poprzednia wersja: jeden trigger FOR EACH ROW na wszystkie zdarzenia
+        statements.append(f"DROP TRIGGER IF EXISTS {table}_users_tsvector ON {table}")
+        for event, referencing in RELATION_TRIGGER_EVENTS.items():
+            statements += [
+                f"DROP TRIGGER IF EXISTS {table}_users_tsvector_{event} ON {table}",
+                f"""CREATE TRIGGER {table}_users_tsvector_{event} AFTER {event.upper()} ON {table}
+                    {referencing}
+                    FOR EACH STATEMENT EXECUTE FUNCTION users_tsvector_relation_trigger()""",
+            ]
+    return statements
+
+
+async def install_fts_triggers(conn, rebuild: bool = True):
+    """
+    Idempotentnie instaluje funkcje i triggery FTS (wywoływane z init_db.py)
+    i (opcjonalnie) przelicza tsvector wszystkich profili.
+    """
+    for statement in trigger_statements():
+        await conn.execute(text(statement))
+    if rebuild:
+        await conn.execute(text("UPDATE users SET tsvector_col = users_build_tsvector(id, ai_summary)"))
+
@@ -0,0 +1,351 @@
+# core/llm_gateway.py
+"""
+Centralna bramka dla wszystkich wywołań LLM i embeddingów.
+
+Zapewnia:
+- wspólne pule połączeń HTTP dla wszystkich klientów OpenAI,
+- limitowanie zapytań (token bucket) per model, wspólne dla całego procesu,
+- ponawianie z wykładniczym backoffem i losowym jitterem,
+- single-flight: identyczne, równolegle wykonywane zapytania współdzielą jedno wywołanie,
+- wymienny backend ("openai" lub lokalny "stub").
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import random
+import threading
+import time
+from types import UnionType
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Type, Union, get_args, get_origin
+
+from langchain_core.messages import AIMessage
+from langchain_core.runnables import RunnableLambda
+from pydantic import BaseModel
+
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+
+# --- Limitowanie zapytań ---
+
+class TokenBucket:
+    """
+    Token bucket bezpieczny zarówno dla wątków, jak i korutyn.
+    Żeton jest rezerwowany od razu (saldo może zejść poniżej zera),
+    a wywołujący odczekuje wyliczony czas - dzięki temu kolejność jest sprawiedliwa.
+    """
+    def __init__(self, rate_per_minute: int):
+        self.capacity = max(1, rate_per_minute)
+        self.rate = self.capacity / 60.0
+        self._tokens = float(self.capacity)
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _reserve(self) -> float:
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+            self._updated_at = now
+            self._tokens -= 1
+            return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+    async def acquire(self):
+        wait = self._reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def acquire_sync(self):
+        wait = self._reserve()
+        if wait > 0:
+            time.sleep(wait)
+
+
+def _backoff_delay(attempt: int) -> float:
+    """Wykładniczy backoff z pełnym jitterem."""
+    ceiling = min(settings.LLM_BACKOFF_MAX_SECONDS, settings.LLM_BACKOFF_BASE_SECONDS * (2 ** attempt))
+    return random.uniform(0, ceiling)
+
+
+# --- Backendy ---
+
+class OpenAIBackend:
+    """Backend produkcyjny: klienci LangChain/OpenAI na wspólnych pulach połączeń httpx."""
+    def __init__(self):
+        import httpx
+        limits = httpx.Limits(
+            max_connections=settings.LLM_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.LLM_MAX_KEEPALIVE_CONNECTIONS,
+        )
+        timeout = httpx.Timeout(settings.LLM_TIMEOUT_SECONDS)
+        self._http_client = httpx.Client(limits=limits, timeout=timeout)
+        self._http_async_client = httpx.AsyncClient(limits=limits, timeout=timeout)
+        self._chat_models: Dict[str, Any] = {}
+        self._embeddings: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+
+    def _chat_model(self, profile: str, schema: Optional[Type[BaseModel]] = None):
+        key = f"{profile}:{schema.__name__}" if schema else profile
+        with self._lock:
+            if key not in self._chat_models:
+                from langchain_openai import ChatOpenAI
+                cfg = settings.LLM_MODELS[profile]
+                model = ChatOpenAI(
+                    model=cfg["model"],
+                    temperature=cfg["temperature"],
+                    http_client=self._http_client,
+                    http_async_client=self._http_async_client,
+                    max_retries=0,  # Ponawianiem zarządza bramka
+                )
+                self._chat_models[key] = model.with_structured_output(schema) if schema else model
+            return self._chat_models[key]
+
+    def _embeddings_model(self, model: Optional[str] = None):
+        model = model or settings.EMBEDDING_MODEL
+        with self._lock:
+            if model not in self._embeddings:
+                from langchain_openai import OpenAIEmbeddings
+                self._embeddings[model] = OpenAIEmbeddings(
+                    model=model,
+                    http_client=self._http_client,
+                    http_async_client=self._http_async_client,
+                    max_retries=0,
+                )
+            return self._embeddings[model]
+
+    def warm_up(self, profiles: List[str]):
+        """Tworzy klientów z wyprzedzeniem, aby pierwsze zapytanie nie płaciło za import i konfigurację."""
+        for profile in profiles:
+            self._chat_model(profile)
+        self._embeddings_model()
+
+    async def achat(self, profile: str, prompt: Any, schema: Optional[Type[BaseModel]] = None) -> Any:
+        return await self._chat_model(profile, schema).ainvoke(prompt)
+
+    def chat(self, profile: str, prompt: Any, schema: Optional[Type[BaseModel]] = None) -> Any:
+        return self._chat_model(profile, schema).invoke(prompt)
+
+    async def aembed_query(self, text: str, model: str) -> List[float]:
+        return await self._embeddings_model(model).aembed_query(text)
+
+    async def aembed_documents(self, texts: List[str], model: str) -> List[List[float]]:
+        return await self._embeddings_model(model).aembed_documents(texts)
+
+    def is_retryable(self, exc: Exception) -> bool:
+        import openai
+        return isinstance(exc, (openai.RateLimitError, openai.APITimeoutError,
+                                openai.APIConnectionError, openai.InternalServerError))
+
+    async def aclose(self):
+        await self._http_async_client.aclose()
+        self._http_client.close()
+
+
+def _stub_default(annotation: Any) -> Any:
+    """Najprostsza poprawna wartość dla typu pola (wymagane pola schematu w StubBackend)."""
+    origin = get_origin(annotation)
+    if origin in (Union, UnionType):
+        args = get_args(annotation)
+        return None if type(None) in args else _stub_default(args[0])
+    if origin in (list, set, tuple):
+        return []
+    if origin is dict:
+        return {}
+    if isinstance(annotation, type) and issubclass(annotation, BaseModel):
+        return _stub_instance(annotation, {})
+    return {str: "", int: 0, float: 0.0, bool: False}.get(annotation)
+
+
+def _stub_instance(schema: Type[BaseModel], data: Any) -> BaseModel:
+    """Poprawna instancja schematu: dane z respondera uzupełnione wartościami domyślnymi wymaganych pól."""
+    values = dict(data) if isinstance(data, dict) else {}
+    for name, field in schema.model_fields.items():
+        if name not in values and field.is_required():
+            values[name] = _stub_default(field.annotation)
+    return schema.model_validate(values)
+
+
+class StubBackend:
+    """
+    Lokalny backend bez wywołań sieciowych (testy, środowiska deweloperskie).
+    Odpowiedzi czatu można podmienić przez `responder(profile, prompt_text) -> str`;
+    przy wywołaniach ze schematem (structured output) odpowiedź jest parsowana jako JSON,
+    a brakujące wymagane pola dostają wartości domyślne.
+    """
+    EMBEDDING_DIM = 1536
+
+    def __init__(self, responder: Optional[Callable[[str, str], str]] = None):
+        self.responder = responder or (lambda profile, text: "{}")
+
+    def warm_up(self, profiles: List[str]):
+        pass
+
+    def chat(self, profile: str, prompt: Any, schema: Optional[Type[BaseModel]] = None) -> Any:
+        if schema is not None:
+            try:
+                data = json.loads(self.responder(profile, _prompt_text(prompt)))
+            except (TypeError, ValueError):
+                data = {}
+            return _stub_instance(schema, data)
+        return AIMessage(content=self.responder(profile, _prompt_text(prompt)))
+
+    async def achat(self, profile: str, prompt: Any, schema: Optional[Type[BaseModel]] = None) -> Any:
+        return self.chat(profile, prompt, schema)
+
+    async def aembed_query(self, text: str, model: str) -> List[float]:
+        # Deterministyczny pseudo-wektor wyprowadzony z hasha modelu i tekstu
+        rng = random.Random(hashlib.sha256(f"{model}|{text}".encode("utf-8")).digest())
+        return [rng.uniform(-1, 1) for _ in range(self.EMBEDDING_DIM)]
+
+    async def aembed_documents(self, texts: List[str], model: str) -> List[List[float]]:
+        return [await self.aembed_query(t, model) for t in texts]
+
+    def is_retryable(self, exc: Exception) -> bool:
+        return False
+
+    async def aclose(self):
+        pass
+
+
+BACKENDS: Dict[str, Callable[[], Any]] = {
+    "openai": OpenAIBackend,
+    "stub": StubBackend,
+}
+
+
+def _prompt_text(prompt: Any) -> str:
+    if hasattr(prompt, "to_string"):
+        return prompt.to_string()
+    return str(prompt)
+
+
+# --- Bramka ---
+
+class LLMGateway:
+    def __init__(self, backend: Any = None):
+        self._backend = backend
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._buckets_lock = threading.Lock()
+        self._in_flight: Dict[str, asyncio.Future] = {}
+
+    @property
+    def backend(self):
+        if self._backend is None:
+            self._backend = BACKENDS[settings.LLM_BACKEND]()
+        return self._backend
+
+    def warm_up(self, profiles: Optional[List[str]] = None):
+        """Inicjalizuje backend i klientów wskazanych profili (domyślnie tych używanych przez /search)."""
+        self.backend.warm_up(profiles or ["query", "rerank", "summary"])
+
+    def set_backend(self, backend: Any):
+        """Podmienia backend (np. na StubBackend w testach)."""
+        self._backend = backend
+        self._in_flight.clear()
+
+    def _bucket(self, model: str, default_rpm: Optional[int] = None) -> Optional[TokenBucket]:
+        rpm = settings.LLM_RATE_LIMITS_RPM.get(model, default_rpm)
+        if not rpm:
+            return None
+        with self._buckets_lock:
+            if model not in self._buckets:
+                self._buckets[model] = TokenBucket(rpm)
+            return self._buckets[model]
+
+    async def _call(self, model: str, key: str, fn: Callable[[], Awaitable[Any]], default_rpm: Optional[int] = None) -> Any:
+        """Single-flight + limit + ponawianie dla pojedynczego wywołania asynchronicznego."""
+        existing = self._in_flight.get(key)
+        if existing is not None:
+            try:
+                return await asyncio.shield(existing)
+            except asyncio.CancelledError:
+                if not existing.cancelled():
+                    raise
+                # Anulowano wywołanie prowadzące (np. termin innego zapytania) - wykonujemy własne
+                return await self._call(model, key, fn, default_rpm)
+
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = future
+        try:
+            result = await self._with_retry(model, fn, default_rpm)
+            future.set_result(result)
+            return result
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Zapobiega ostrzeżeniu "exception was never retrieved", gdy nikt inny nie czekał
+            future.exception()
+            raise
+        finally:
+            self._in_flight.pop(key, None)
+
+    async def _with_retry(self, model: str, fn: Callable[[], Awaitable[Any]], default_rpm: Optional[int] = None) -> Any:
+        bucket = self._bucket(model, default_rpm)
+        attempt = 0
+        while True:
+            if bucket:
+                await bucket.acquire()
+            try:
+                return await fn()
+            except Exception as e:
+                if attempt >= settings.LLM_MAX_RETRIES or not self.backend.is_retryable(e):
+                    raise
+                delay = _backoff_delay(attempt)
+                logger.warning(f"Wywołanie {model} nieudane ({e}). Ponawiam za {delay:.2f}s (próba {attempt + 1}).")
+                await asyncio.sleep(delay)
+                attempt += 1
+
+    def _with_retry_sync(self, model: str, fn: Callable[[], Any]) -> Any:
+        bucket = self._bucket(model)
+        attempt = 0
+        while True:
+            if bucket:
+                bucket.acquire_sync()
+            try:
+                return fn()
+            except Exception as e:
+                if attempt >= settings.LLM_MAX_RETRIES or not self.backend.is_retryable(e):
+                    raise
+                delay = _backoff_delay(attempt)
+                logger.warning(f"Wywołanie {model} nieudane ({e}). Ponawiam za {delay:.2f}s (próba {attempt + 1}).")
+                time.sleep(delay)
+                attempt += 1
+
+    # --- Publiczne API ---
+
+    def chat(self, profile: str, schema: Optional[Type[BaseModel]] = None) -> RunnableLambda:
+        """
+        Zwraca Runnable do użycia w łańcuchach LangChain w miejsce klienta ChatOpenAI,
+        np. `prompt | gateway.chat("rerank") | parser`.
+        """
+        model = settings.LLM_MODELS[profile]["model"]
+
+        async def ainvoke(prompt: Any) -> Any:
+            key = hashlib.sha256(f"{profile}|{schema.__name__ if schema else ''}|{_prompt_text(prompt)}".encode("utf-8")).hexdigest()
+            return await self._call(model, key, lambda: self.backend.achat(profile, prompt, schema))
+
+        def invoke(prompt: Any) -> Any:
+            return self._with_retry_sync(model, lambda: self.backend.chat(profile, prompt, schema))
+
+        return RunnableLambda(invoke, afunc=ainvoke, name=f"llm_gateway:{profile}")
+
+    async def aembed_query(self, text: str, model: Optional[str] = None) -> List[float]:
+        """`model` - model embeddingów (domyślnie EMBEDDING_MODEL); aktywny model zwraca core/embedding_models.py."""
+        model = model or settings.EMBEDDING_MODEL
+        key = f"embed|{model}|" + hashlib.sha256(text.encode("utf-8")).hexdigest()
+        return await self._call(model, key, lambda: self.backend.aembed_query(text, model), settings.LLM_RPM_EMBEDDINGS)
+
+    async def aembed_documents(self, texts: List[str], model: Optional[str] = None) -> List[List[float]]:
+        model = model or settings.EMBEDDING_MODEL
+        key = f"embed_docs|{model}|" + hashlib.sha256("\x1e".join(texts).encode("utf-8")).hexdigest()
+        return await self._call(model, key, lambda: self.backend.aembed_documents(texts, model), settings.LLM_RPM_EMBEDDINGS)
+
+    async def aclose(self):
+        if self._backend is not None:
+            await self._backend.aclose()
+
+
+gateway = LLMGateway()
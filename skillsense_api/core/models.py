@@ -1,7 +1,7 @@
 # core/models.py
 from sqlalchemy import (Column, Integer, String, Table, ForeignKey, Text, JSON, 
-                        DateTime, Enum as SQLAlchemyEnum, Index, func)
-from sqlalchemy.orm import relationship
+                        Date, DateTime, Float, Boolean, Enum as SQLAlchemyEnum, Index, func)
+from sqlalchemy.orm import relationship, deferred
 from pgvector.sqlalchemy import Vector
 from sqlalchemy.dialects.postgresql import TSVECTOR
 from .database import Base
@@ -44,6 +44,9 @@ class User(Base):
     github_url = Column(String, nullable=True)
     ai_summary = Column(Text, nullable=True)
     embedding = Column(Vector(1536), nullable=True) # Wymiar dla text-embedding-ada-002
+    # Kolumna robocza dla `reembed.py --target shadow`; zamieniana z `embedding` atomowo (--swap).
+    # Modele obu kolumn zapisane są w tabeli `embedding_models`
+    embedding_shadow = deferred(Column(Vector(1536), nullable=True))
     cv_filepath = Column(String, nullable=True)
     cv_file_hash = Column(String, unique=True, index=True, nullable=True)
     other_data = Column(JSON, nullable=True)
@@ -51,6 +54,15 @@ class User(Base):
     # NOWOŚĆ: Kolumna TSVECTOR dla Full-Text Search
     tsvector_col = Column(TSVECTOR, nullable=True)
 
+    # Doświadczenie zawodowe w miesiącach ze scalonych, zakończonych okresów work_experience
+    # oraz początek trwającego okresu - łączne doświadczenie (core/experience.py) liczone jest
+    # w chwili zapytania i używane jako filtr SQL już na etapie wyszukiwania
+    experience_months = Column(Integer, nullable=True, index=True)
+    experience_ongoing_since = Column(Date, nullable=True)
+
+    # Znacznik ostatniej zmiany profilu - używany do odświeżania indeksu wektorowego w pamięci
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), index=True)
+
     # Relacje ze zoptymalizowaną strategią ładowania 'selectin'
     skills = relationship("Skill", secondary=user_skills_table, back_populates="users", lazy="selectin")
     work_experiences = relationship("WorkExperience", back_populates="user", cascade="all, delete-orphan", lazy="selectin")
@@ -135,3 +147,50 @@ class RecruitmentProject(Base):
     description = Column(Text, nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     candidates = relationship("User", secondary=project_candidates_table, back_populates="recruitment_projects")
+    saved_searches = relationship("SavedSearch", back_populates="project", cascade="all, delete-orphan")
+
+class SavedSearch(Base):
+    """Zapisane wyszukiwanie projektu rekrutacyjnego, oceniane przyrostowo względem nowych CV."""
+    __tablename__ = "saved_searches"
+    id = Column(Integer, primary_key=True, index=True)
+    project_id = Column(Integer, ForeignKey('recruitment_projects.id'), nullable=False, index=True)
+    query = Column(Text, nullable=False)
+    deconstructed_query = Column(JSON, nullable=False)  # QueryDeconstruction.model_dump()
+    query_embedding = deferred(Column(Vector(1536), nullable=False))
+    query_embedding_model = Column(String, nullable=True)  # model, którym policzono query_embedding
+    min_score = Column(Float, nullable=False, default=35.0)
+    is_active = Column(Boolean, nullable=False, default=True, index=True)
+    last_run_at = Column(DateTime(timezone=True), nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    project = relationship("RecruitmentProject", back_populates="saved_searches")
+    results = relationship("SavedSearchResult", back_populates="saved_search", cascade="all, delete-orphan")
+
+class SavedSearchResult(Base):
+    """Ostatnia ocena danego profilu względem zapisanego wyszukiwania."""
+    __tablename__ = "saved_search_results"
+    saved_search_id = Column(Integer, ForeignKey('saved_searches.id'), primary_key=True)
+    user_id = Column(Integer, ForeignKey('users.id'), primary_key=True, index=True)
+    match_score = Column(Float, nullable=False)
+    reasoning = Column(Text, nullable=True)
+    profile_version = Column(String, nullable=True)  # cv_file_hash ocenianego profilu
+    scored_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+    saved_search = relationship("SavedSearch", back_populates="results")
+
+class SearchSummary(Base):
+    """Podsumowanie wyników /search dla tokenu (core/summary_store.py) - wspólne dla wszystkich workerów."""
+    __tablename__ = "search_summaries"
+    token = Column(String(64), primary_key=True)
+    summary = Column(Text, nullable=True)  # NULL - podsumowanie w trakcie generowania
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
+
+class EmbeddingModels(Base):
+    """
+    Jeden wiersz (id=1): model wektorów w `users.embedding` i - podczas przeliczania
+    (`reembed.py --target shadow`) - w `users.embedding_shadow`. Zmieniany w tej samej
+    transakcji co zamiana kolumn, więc API zawsze wie, którym modelem liczyć zapytania.
+    """
+    __tablename__ = "embedding_models"
+    id = Column(Integer, primary_key=True)
+    active_model = Column(String, nullable=False)
+    shadow_model = Column(String, nullable=True)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
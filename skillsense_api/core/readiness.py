@@ -0,0 +1,77 @@
+# core/readiness.py
+"""
+Rozgrzewanie procesu API i raportowanie gotowości (warm/cold).
+
+Ciężkie zależności (klienci LLM, indeks wektorowy) nie są tworzone przy imporcie.
+Hook lifespan uruchamia `warm_up()` w tle, więc worker przyjmuje ruch od razu,
+a /ready pozwala load balancerowi odczekać, aż wszystkie komponenty będą gotowe.
+"""
+import asyncio
+import logging
+import time
+from typing import Dict, Optional
+
+from sqlalchemy import text
+
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class ReadinessState:
+    def __init__(self):
+        self.started_at = time.perf_counter()
+        self.import_seconds: Optional[float] = None
+        self.warmup_seconds: Optional[float] = None
+        self.components: Dict[str, str] = {"database": "cold", "llm_gateway": "cold"}
+        if settings.VECTOR_INDEX_ENABLED:
+            self.components["vector_index"] = "cold"
+
+    @property
+    def is_warm(self) -> bool:
+        return all(state == "warm" for state in self.components.values())
+
+    def as_dict(self) -> dict:
+        return {
+            "status": "warm" if self.is_warm else "cold",
+            "components": dict(self.components),
+            "import_seconds": self.import_seconds,
+            "warmup_seconds": self.warmup_seconds,
+        }
+
+
+readiness = ReadinessState()
+
+
+async def _warm_component(name: str, coro) -> None:
+    try:
+        await coro
+        readiness.components[name] = "warm"
+    except Exception as e:
+        readiness.components[name] = "failed"
+        logger.error(f"Rozgrzewanie komponentu '{name}' nieudane: {e}")
+
+
+async def _ping_database() -> None:
+    """Otwiera pierwsze połączenia w obu pulach (primary i odczytowej/replice)."""
+    from .database import engine, read_engine
+    for eng in (engine, read_engine):
+        async with eng.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+
+
+async def warm_up() -> None:
+    """Inicjalizuje równolegle połączenie z bazą, klientów LLM i (opcjonalnie) indeks wektorowy."""
+    from . import vector_index
+    from .llm_gateway import gateway
+
+    start = time.perf_counter()
+    tasks = [
+        _warm_component("database", _ping_database()),
+        _warm_component("llm_gateway", asyncio.to_thread(gateway.warm_up)),
+    ]
+    if settings.VECTOR_INDEX_ENABLED:
+        tasks.append(_warm_component("vector_index", vector_index.start()))
+    await asyncio.gather(*tasks)
+    readiness.warmup_seconds = time.perf_counter() - start
+    logger.info(f"Rozgrzewanie zakończone w {readiness.warmup_seconds:.2f}s: {readiness.components}")
@@ -1,6 +1,7 @@
 # core/schemas.py
 from pydantic import BaseModel, EmailStr, ConfigDict, Field
 from typing import List, Optional, Dict, Any, TypeVar, Generic
+from datetime import datetime
 
 # --- Schematy Relacyjne ---
 class Skill(BaseModel):
@@ -82,20 +83,64 @@ class User(UserBase):
 DataType = TypeVar('DataType')
 
 class PaginatedResponse(BaseModel, Generic[DataType]):
-    total: int
+    total: int = Field(description="Liczba wyników; w /search dolna granica, gdy re-ranking zakończył się wcześniej (patrz has_more).")
     page: int
     limit: int
     items: List[DataType]
+    has_more: bool = Field(False, description="True, jeśli istnieją kolejne strony wyników.")
 
 # --- Ulepszone Schematy dla Wyszukiwania ---
 
 class SearchResultProfile(User):
     match_score: float = Field(description="Ocena dopasowania kandydata w skali 0-100.")
     reasoning: Optional[str] = Field(None, description="Uzasadnienie oceny wygenerowane przez LLM.")
+    reranked: bool = Field(True, description="False, jeśli ocena LLM nie zdążyła przed terminem - match_score to wtedy znormalizowany wynik RRF.")
 
 class SearchResponse(BaseModel):
-    summary: str = Field(description="Podsumowanie wyników wyszukiwania wygenerowane przez LLM.")
+    summary: Optional[str] = Field(None, description="Podsumowanie wyników, jeśli jest już dostępne (np. z cache).")
+    summary_token: Optional[str] = Field(None, description="Token do pobrania podsumowania przez /search/summary/{token}.")
     profiles: PaginatedResponse[SearchResultProfile]
+    degraded: bool = Field(False, description="True, jeśli z powodu przeciążenia pominięto re-ranking i podsumowanie (kolejność RRF).")
+    stages: Dict[str, str] = Field(default_factory=dict, description="Stan etapów potoku: completed, partial, deferred, skipped lub timed_out.")
+
+class SummaryResponse(BaseModel):
+    token: str
+    status: str = Field(description="Stan podsumowania: 'ready', 'pending' lub 'failed'.")
+    summary: Optional[str] = None
+
+# --- Schematy Podobnych Kandydatów ---
+
+class SimilarCandidate(User):
+    match_score: float = Field(description="Znormalizowany wynik fuzji (0-100): podobieństwo embeddingów i wspólne umiejętności.")
+    shared_skills: List[str] = Field(default_factory=list, description="Umiejętności wspólne z profilem wzorcowym.")
+
+# --- Schematy Zapisanych Wyszukiwań ---
+
+class SavedSearchCreate(BaseModel):
+    query: str = Field(..., min_length=3, description="Zapytanie w języku naturalnym")
+    min_score: float = Field(35.0, ge=0, le=100, description="Minimalna ocena, od której kandydat trafia do projektu.")
+
+class SavedSearch(BaseModel):
+    id: int
+    project_id: int
+    query: str
+    min_score: float
+    is_active: bool
+    last_run_at: Optional[datetime] = None
+    created_at: Optional[datetime] = None
+    model_config = ConfigDict(from_attributes=True)
+
+class SavedSearchResult(BaseModel):
+    user_id: int
+    match_score: float
+    reasoning: Optional[str] = None
+    scored_at: Optional[datetime] = None
+    model_config = ConfigDict(from_attributes=True)
+
+class SavedSearchRunResult(BaseModel):
+    saved_search_id: int
+    evaluated: int = Field(description="Liczba profili ocenionych w tym przebiegu.")
+    qualified: int = Field(description="Liczba profili powyżej progu (dodanych do projektu).")
 
 # --- Pozostałe Schematy ---
 
@@ -0,0 +1,56 @@
+# core/score_cache.py
+"""
+Cache ocen re-rankingu gpt-4o per (zapytanie, kandydat, wersja profilu).
+
+Każda strona /search ponownie przechodzi pulę kandydatów od początku - dzięki temu
+cache strona N nie płaci ponownie za oceny ze stron 1..N-1, a budżet
+RERANK_MAX_EXPENSIVE_CALLS obejmuje tylko nowe wywołania. Wersją profilu jest hash
+pliku CV, więc ponowne wgranie CV unieważnia jego oceny.
+
+UWAGA: Cache jest lokalny dla procesu (jak core/similar_cache.py) - na innym workerze
+kolejna strona ocenia kandydatów od nowa, co kosztuje, ale nie zmienia wyników.
+"""
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from .config import settings
+
+ScoreKey = Tuple[str, int, str]
+
+
+def score_key(query: str, profile: Any) -> ScoreKey:
+    return query.strip().lower(), profile.id, profile.cv_file_hash or ""
+
+
+class RerankScoreCache:
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        # klucz -> (czas wygaśnięcia, {'match_score', 'reasoning'}), w kolejności LRU
+        self._entries: "OrderedDict[ScoreKey, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+
+    def get(self, query: str, profile: Any) -> Optional[Dict[str, Any]]:
+        key = score_key(query, profile)
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, score = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return score
+
+    def set(self, query: str, profile: Any, match_score: float, reasoning: Optional[str]) -> None:
+        key = score_key(query, profile)
+        self._entries[key] = (time.monotonic() + self.ttl_seconds, {"match_score": match_score, "reasoning": reasoning})
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+
+rerank_score_cache = RerankScoreCache(
+    max_entries=settings.RERANK_SCORE_CACHE_MAX_ENTRIES,
+    ttl_seconds=settings.RERANK_SCORE_CACHE_TTL_SECONDS,
+)
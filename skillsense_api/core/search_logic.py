@@ -1,24 +1,44 @@
 # core/search_logic.py
 import asyncio
 import logging
-from typing import List, Dict, Any, Set, Optional
+import time
+from typing import List, Dict, Any, Set, Optional, Tuple
 from sqlalchemy.ext.asyncio import AsyncSession
-from langchain_openai import ChatOpenAI, OpenAIEmbeddings
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import JsonOutputParser, StrOutputParser
 from pydantic import BaseModel, Field
 
-from . import crud, schemas
+from . import crud, embedding_models, schemas
+from .config import settings
+from .llm_gateway import gateway
+from .vector_index import get_ready_index
+from .summary_store import summary_store, summary_token
+from .score_cache import rerank_score_cache
 
 # --- Konfiguracja ---
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# --- Inicjalizacja Modeli AI ---
-query_llm = ChatOpenAI(model="gpt-4o-mini", temperature=0.0)
-rerank_llm = ChatOpenAI(model="gpt-4o", temperature=0.1)
-summary_llm = ChatOpenAI(model="gpt-4o", temperature=0.3)
-embeddings_model = OpenAIEmbeddings(model="text-embedding-ada-002") # 1536 wymiarów
+# --- Budżet czasu zapytania ---
+class SearchDeadlineExceeded(Exception):
+    """Nie zdążono nawet z wyszukiwaniem kandydatów - nie ma czego zwrócić."""
+
+class Deadline:
+    """Termin wykonania zapytania, przekazywany przez wszystkie etapy potoku."""
+    def __init__(self, seconds: float):
+        self.seconds = seconds
+        self.expires_at = time.monotonic() + seconds
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    @property
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+    def budget(self, seconds: float) -> float:
+        """Limit dla pojedynczego etapu: nie dłużej niż `seconds` i nie po terminie całego zapytania."""
+        return min(seconds, self.remaining())
 
 # --- Krok 1: Zaawansowane Przetwarzanie Zapytań ---
 class QueryDeconstruction(BaseModel):
@@ -38,7 +58,7 @@ async def deconstruct_query(query: str) -> QueryDeconstruction:
         """,
         partial_variables={"format_instructions": parser.get_format_instructions()}
     )
-    chain = prompt | query_llm | parser
+    chain = prompt | gateway.chat("query") | parser
     try:
         result = await chain.ainvoke({"query": query})
         return QueryDeconstruction(**result)
@@ -47,17 +67,35 @@ async def deconstruct_query(query: str) -> QueryDeconstruction:
         return QueryDeconstruction(semantic_query=query)
 
 # --- Krok 2: Wielowarstwowe Wyszukiwanie Hybrydowe ---
-async def hybrid_search(db: AsyncSession, deconstructed_query: QueryDeconstruction) -> List[Any]:
-    embedding_task = asyncio.create_task(
-        embeddings_model.aembed_query(deconstructed_query.semantic_query)
-    )
+async def hybrid_search(
+    db: AsyncSession, deconstructed_query: QueryDeconstruction, query_embedding: Optional[List[float]] = None,
+    embedding_model: Optional[str] = None
+) -> List[Dict[str, Any]]:
+    """
+    Zwraca kandydatów w kolejności RRF jako listę słowników {'profile', 'rrf_score'}.
+    `query_embedding` pozwala użyć zapisanego wcześniej wektora zapytania (np. zapisane wyszukiwania),
+    policzonego modelem `embedding_model`.
+    """
+    # Model odczytany przed zadaniami równoległymi - sesja nie obsługuje współbieżnych zapytań
+    if embedding_model is None:
+        embedding_model = (await embedding_models.current(db)).active
+    if query_embedding is not None:
+        embedding_task = asyncio.sleep(0, result=query_embedding)
+    else:
+        embedding_task = asyncio.create_task(
+            gateway.aembed_query(deconstructed_query.semantic_query, embedding_model)
+        )
+    # Wymagane lata doświadczenia filtrują kandydatów już w obu gałęziach wyszukiwania
+    min_experience_months = deconstructed_query.experience_years * 12 if deconstructed_query.experience_years else None
     all_skills = list(set(deconstructed_query.required_skills + deconstructed_query.nice_to_have_skills))
     fts_task = asyncio.create_task(
-        crud.full_text_search_users(db, query_text=" ".join(all_skills))
+        crud.full_text_search_users(db, query_text=" ".join(all_skills), min_experience_months=min_experience_months)
     )
     
     query_embedding, fts_results = await asyncio.gather(embedding_task, fts_task)
-    vector_results = await crud.vector_search_users(db, query_embedding=query_embedding)
+    vector_ids = await vector_search_ids(
+        db, deconstructed_query.semantic_query, query_embedding, embedding_model, min_experience_months
+    )
     
     ranked_list: Dict[int, float] = {}
     k = 60
@@ -67,10 +105,10 @@ async def hybrid_search(db: AsyncSession, deconstructed_query: QueryDeconstructi
             ranked_list[doc.id] = 0.0
         ranked_list[doc.id] += 1.0 / (k + rank)
         
-    for rank, doc in enumerate(vector_results):
-        if doc.id not in ranked_list:
-            ranked_list[doc.id] = 0.0
-        ranked_list[doc.id] += 1.0 / (k + rank)
+    for rank, doc_id in enumerate(vector_ids):
+        if doc_id not in ranked_list:
+            ranked_list[doc_id] = 0.0
+        ranked_list[doc_id] += 1.0 / (k + rank)
 
     sorted_ids = sorted(ranked_list.keys(), key=lambda id: ranked_list[id], reverse=True)
     
@@ -82,10 +120,60 @@ async def hybrid_search(db: AsyncSession, deconstructed_query: QueryDeconstructi
         user_ids=sorted_ids,
         required_skills=deconstructed_query.required_skills
     )
-    return initial_candidates
+    return [{"profile": c, "rrf_score": ranked_list[c.id]} for c in initial_candidates]
+
+async def vector_search_ids(
+    db: AsyncSession, semantic_query: str, query_embedding: List[float], embedding_model: str,
+    min_experience_months: Optional[int] = None, limit: int = 50
+) -> List[int]:
+    """
+    ID najbliższych profili. Indeks w pamięci jest używany tylko, gdy trzyma wektory modelu
+    zapytania. Zapytanie do bazy sprawdza model w tej samej instrukcji - pusty wynik po zamianie
+    kolumn (nieaktualny cache modelu) powtarzamy z wektorem zapytania policzonym nowym modelem.
+    """
+    index = get_ready_index()
+    if index is not None and index.model == embedding_model:
+        return await asyncio.to_thread(index.search, query_embedding, limit, min_experience_months)
+    ids = await crud.vector_search_user_ids(
+        db, query_embedding=query_embedding, limit=limit,
+        min_experience_months=min_experience_months, embedding_model=embedding_model
+    )
+    if not ids:
+        active = (await embedding_models.current(db, refresh=True)).active
+        if active != embedding_model:
+            logger.info(f"Model embeddingów zmieniony ({embedding_model} -> {active}) - ponawiam wyszukiwanie wektorowe.")
+            query_embedding = await gateway.aembed_query(semantic_query, active)
+            return await vector_search_ids(db, semantic_query, query_embedding, active, min_experience_months, limit)
+    return ids
 
-# --- Krok 3: Dynamiczny Re-ranking z Kontekstem ---
-async def rerank_candidates(query: str, candidates: List[Any]) -> List[Dict[str, Any]]:
+# --- Krok 3: Kaskadowy, budżetowany Re-ranking ---
+def heuristic_score(candidate: Dict[str, Any], deconstructed_query: QueryDeconstruction, max_rrf: float) -> float:
+    """
+    Tania ocena w procesie (0-100): pokrycie umiejętności (wymagane liczone podwójnie)
+    połączone ze znormalizowanym wynikiem RRF z wyszukiwania hybrydowego.
+    """
+    candidate_skills = {s.name.lower() for s in candidate["profile"].skills}
+    required = {s.lower() for s in deconstructed_query.required_skills}
+    nice = {s.lower() for s in deconstructed_query.nice_to_have_skills} - required
+    wanted_weight = 2 * len(required) + len(nice)
+    rrf_part = candidate["rrf_score"] / max_rrf if max_rrf else 0.0
+    if not wanted_weight:
+        return 100.0 * rrf_part
+    overlap = (2 * len(required & candidate_skills) + len(nice & candidate_skills)) / wanted_weight
+    return 100.0 * (0.6 * overlap + 0.4 * rrf_part)
+
+async def llm_score_candidates(query: str, candidates: List[Dict[str, Any]], profile: str) -> List[Dict[str, Any]]:
+    """Ocena kandydatów przez LLM wskazanego profilu bramki (np. 'rerank_fast' lub 'rerank')."""
+    scored, _ = await llm_score_candidates_until(query, candidates, profile, timeout=None)
+    return scored
+
+async def llm_score_candidates_until(
+    query: str, candidates: List[Dict[str, Any]], profile: str, timeout: Optional[float]
+) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """
+    Jak `llm_score_candidates`, ale z limitem czasu. Zwraca (ocenieni, nieukończeni) -
+    wywołania, które nie zdążyły przed `timeout`, są anulowane.
+    """
     parser = JsonOutputParser()
     prompt = ChatPromptTemplate.from_template(
         template="""
@@ -98,29 +186,114 @@ async def rerank_candidates(query: str, candidates: List[Any]) -> List[Dict[str,
         """,
         partial_variables={"format_instructions": parser.get_format_instructions()}
     )
-    chain = prompt | rerank_llm | parser
+    chain = prompt | gateway.chat(profile) | parser
 
-    async def rate_candidate(candidate):
+    async def rate_candidate(item):
+        candidate = item["profile"]
         context = (f"Podsumowanie: {candidate.ai_summary}\n"
                    f"Umiejętności: {', '.join([s.name for s in candidate.skills])}\n"
                    f"Doświadczenie: {' '.join([w.position + ' w ' + w.company for w in candidate.work_experiences])}")
         try:
             result = await chain.ainvoke({"query": query, "context": context})
             return {
-                "profile": candidate,
+                **item,
                 "match_score": float(result.get("score", 0)),
                 "reasoning": result.get("reasoning", "Brak uzasadnienia.")
             }
         except Exception as e:
-            logger.error(f"Błąd re-rankingu dla kandydata {candidate.id}: {e}")
+            logger.error(f"Błąd re-rankingu ({profile}) dla kandydata {candidate.id}: {e}")
             return None
 
-    tasks = [rate_candidate(c) for c in candidates]
-    results = await asyncio.gather(*tasks)
-    
-    valid_results = [r for r in results if r and r["match_score"] > 35]
-    valid_results.sort(key=lambda x: x["match_score"], reverse=True)
-    return valid_results
+    if not candidates:
+        return [], []
+    tasks = [asyncio.create_task(rate_candidate(c)) for c in candidates]
+    done, pending = await asyncio.wait(tasks, timeout=timeout)
+    for task in pending:
+        task.cancel()
+    scored = [t.result() for t in tasks if t in done and not t.cancelled() and t.result()]
+    unfinished = [c for c, t in zip(candidates, tasks) if t in pending]
+    return scored, unfinished
+
+async def rerank_candidates(
+    query: str,
+    candidates: List[Dict[str, Any]],
+    deconstructed_query: QueryDeconstruction,
+    needed: int,
+    first_pass_k: Optional[int] = None,
+    max_expensive_calls: Optional[int] = None,
+    deadline: Optional[Deadline] = None,
+) -> Tuple[List[Dict[str, Any]], int]:
+    """
+    Kaskadowy re-ranking:
+    1. Tania ocena w procesie (umiejętności + RRF) porządkuje i przycina listę do `first_pass_k`.
+    2. Opcjonalnie gpt-4o-mini odrzuca kandydatów poniżej progu.
+    3. gpt-4o ocenia tylko tylu kandydatów, ilu potrzeba do wypełnienia strony (+ margines),
+       partiami, aż uzbiera `needed` wyników powyżej progu lub wyczerpie budżet wywołań.
+       Oceny z wcześniejszych stron tego zapytania są brane z cache i nie liczą się do budżetu.
+
+    Po upływie `deadline` kandydaci bez oceny LLM są dołączani na końcu listy
+    w kolejności RRF, z flagą `reranked=False`.
+
+    Zwraca (kandydaci, nieocenieni), gdzie `nieocenieni` to liczba kandydatów z puli,
+    do których nie doszło ocenianie po zebraniu `needed` wyników - lista jest wtedy
+    dolną granicą liczby trafień.
+    """
+    timeout = deadline.remaining if deadline else (lambda: None)
+    first_pass_k = first_pass_k or settings.RERANK_FIRST_PASS_K
+    max_expensive_calls = max_expensive_calls if max_expensive_calls is not None else settings.RERANK_MAX_EXPENSIVE_CALLS
+    threshold = settings.RERANK_SCORE_THRESHOLD
+
+    max_rrf = max((c["rrf_score"] for c in candidates), default=0.0)
+    pool = sorted(candidates, key=lambda c: heuristic_score(c, deconstructed_query, max_rrf), reverse=True)
+    pool = pool[:max(first_pass_k, needed + settings.RERANK_MARGIN)]
+
+    not_reranked: List[Dict[str, Any]] = []
+    if settings.RERANK_CHEAP_LLM_ENABLED and pool:
+        cheap_scored, unfinished = await llm_score_candidates_until(query, pool, "rerank_fast", timeout())
+        cheap_scored.sort(key=lambda x: x["match_score"], reverse=True)
+        pool = [{"profile": c["profile"], "rrf_score": c["rrf_score"]} for c in cheap_scored if c["match_score"] > threshold]
+        not_reranked.extend(unfinished)
+
+    confirmed: List[Dict[str, Any]] = []
+    position, calls, cached_hits = 0, 0, 0
+    batch_size = needed + settings.RERANK_MARGIN
+    while position < len(pool) and len(confirmed) < needed:
+        if deadline and deadline.expired:
+            not_reranked.extend(pool[position:])
+            break
+        # Oceny z poprzednich stron tego zapytania (core/score_cache.py) nie zużywają budżetu
+        cached = rerank_score_cache.get(query, pool[position]["profile"])
+        if cached is not None:
+            if cached["match_score"] > threshold:
+                confirmed.append({**pool[position], **cached})
+            position += 1
+            cached_hits += 1
+            continue
+        if calls >= max_expensive_calls:
+            break
+        batch = []
+        while (position < len(pool) and len(batch) < min(batch_size, max_expensive_calls - calls)
+               and rerank_score_cache.get(query, pool[position]["profile"]) is None):
+            batch.append(pool[position])
+            position += 1
+        calls += len(batch)
+        scored, unfinished = await llm_score_candidates_until(query, batch, "rerank", timeout())
+        for r in scored:
+            rerank_score_cache.set(query, r["profile"], r["match_score"], r["reasoning"])
+        confirmed.extend(r for r in scored if r["match_score"] > threshold)
+        not_reranked.extend(unfinished)
+        batch_size = settings.RERANK_BATCH_SIZE
+
+    logger.info(f"Re-ranking: pula {len(pool)}, wywołań gpt-4o {calls} (z cache: {cached_hits}), "
+                f"potwierdzonych {len(confirmed)}/{needed}, bez oceny (termin): {len(not_reranked)}.")
+    confirmed.sort(key=lambda x: x["match_score"], reverse=True)
+    for c in confirmed:
+        c["reranked"] = True
+    # Tylko przerwanie po zebraniu `needed` wyników oznacza, że reszta puli czeka na kolejne strony.
+    # Po wyczerpaniu budżetu lub terminu dalszych trafień ta ścieżka nie znajdzie.
+    reached_needed = len(confirmed) >= needed and not (deadline and deadline.expired)
+    unevaluated = len(pool) - position if reached_needed else 0
+    return confirmed + rrf_ranked_candidates(not_reranked, max_rrf), unevaluated
 
 # --- Krok 4: Generowanie Odpowiedzi ---
 async def generate_final_summary(query: str, top_candidates: List[Dict[str, Any]]) -> str:
@@ -142,35 +315,103 @@ async def generate_final_summary(query: str, top_candidates: List[Dict[str, Any]
         Twoje podsumowanie:
         """
     )
-    chain = prompt | summary_llm | StrOutputParser()
+    chain = prompt | gateway.chat("summary") | StrOutputParser()
     return await chain.ainvoke({"query": query, "context": context})
 
 # --- Główny Potok Wyszukiwania ---
-async def perfected_search_pipeline(db: AsyncSession, query: str, skip: int, limit: int) -> schemas.SearchResponse:
-    logger.info(f"Rozpoczynam wyszukiwanie dla zapytania: '{query}'")
+SUMMARY_SKIPPED_DEGRADED = ("Serwis jest obecnie mocno obciążony - wyniki są uporządkowane według trafności "
+                            "wyszukiwania, bez oceny i podsumowania AI.")
+SUMMARY_SKIPPED_DEADLINE = ("Podsumowanie AI zostało pominięte, aby zmieścić się w limicie czasu zapytania. "
+                            "Wyniki poniżej są już dostępne.")
+SUMMARY_SKIPPED_BUSY = ("Podsumowanie AI zostało pominięte z powodu dużej liczby zapytań. "
+                        "Wyniki poniżej są już ocenione.")
+
+def rrf_ranked_candidates(candidates: List[Dict[str, Any]], max_rrf: Optional[float] = None) -> List[Dict[str, Any]]:
+    """Kandydaci bez oceny LLM: kolejność RRF, wynik RRF znormalizowany do skali 0-100."""
+    max_rrf = max_rrf or max((c["rrf_score"] for c in candidates), default=0.0) or 1.0
+    return [
+        {**c, "match_score": round(100.0 * c["rrf_score"] / max_rrf, 1), "reasoning": None, "reranked": False}
+        for c in sorted(candidates, key=lambda c: c["rrf_score"], reverse=True)
+    ]
+
+async def perfected_search_pipeline(
+    db: AsyncSession, query: str, skip: int, limit: int, degraded: bool = False,
+    deadline: Optional[Deadline] = None
+) -> schemas.SearchResponse:
+    """
+    `degraded=True` (przeciążenie, patrz core/admission.py) pomija re-ranking i podsumowanie LLM.
+    `deadline` ogranicza czas całego potoku - etapy, które nie zdążą, zwracają wyniki częściowe,
+    a pole `stages` odpowiedzi opisuje, co zostało ukończone.
+    """
+    deadline = deadline or Deadline(settings.SEARCH_DEADLINE_SECONDS)
+    stages: Dict[str, str] = {}
+    logger.info(f"Rozpoczynam wyszukiwanie dla zapytania: '{query}' (termin: {deadline.remaining():.1f}s)")
     
-    deconstructed_query = await deconstruct_query(query)
+    try:
+        deconstructed_query = await asyncio.wait_for(
+            deconstruct_query(query), timeout=deadline.budget(settings.SEARCH_DECONSTRUCT_TIMEOUT_SECONDS)
+        )
+        stages["deconstruction"] = "completed"
+    except asyncio.TimeoutError:
+        logger.warning("Dekonstrukcja zapytania nie zdążyła przed terminem - używam surowego zapytania.")
+        deconstructed_query = QueryDeconstruction(semantic_query=query)
+        stages["deconstruction"] = "timed_out"
     logger.info(f"Wynik dekonstrukcji: {deconstructed_query.model_dump_json(indent=2)}")
     
-    initial_candidates = await hybrid_search(db, deconstructed_query)
+    try:
+        initial_candidates = await asyncio.wait_for(hybrid_search(db, deconstructed_query), timeout=deadline.remaining())
+    except asyncio.TimeoutError:
+        raise SearchDeadlineExceeded("Wyszukiwanie kandydatów nie zakończyło się przed terminem.")
+    stages["retrieval"] = "completed"
     logger.info(f"Znaleziono {len(initial_candidates)} kandydatów po wyszukiwaniu hybrydowym i filtrowaniu.")
     if not initial_candidates:
-        return schemas.SearchResponse(summary="Nie znaleziono kandydatów pasujących do podstawowych kryteriów.", profiles=schemas.PaginatedResponse(total=0, page=1, limit=limit, items=[]))
+        return schemas.SearchResponse(summary="Nie znaleziono kandydatów pasujących do podstawowych kryteriów.", profiles=schemas.PaginatedResponse(total=0, page=1, limit=limit, items=[]), degraded=degraded, stages=stages)
 
-    reranked_candidates = await rerank_candidates(query, initial_candidates)
-    logger.info(f"Pozostało {len(reranked_candidates)} kandydatów po re-rankingu.")
+    unevaluated = 0
+    if degraded:
+        reranked_candidates = rrf_ranked_candidates(initial_candidates)
+        stages["rerank"] = "skipped"
+        logger.warning("Tryb zdegradowany: pomijam re-ranking i podsumowanie, zwracam kolejność RRF.")
+    else:
+        reranked_candidates, unevaluated = await rerank_candidates(
+            query, initial_candidates, deconstructed_query, needed=skip + limit, deadline=deadline
+        )
+        stages["rerank"] = "completed" if all(c["reranked"] for c in reranked_candidates) else "partial"
+        logger.info(f"Pozostało {len(reranked_candidates)} kandydatów po re-rankingu ({stages['rerank']}).")
     
+    # Po wczesnym zakończeniu re-rankingu `total` jest dolną granicą, a `has_more` sygnalizuje dalsze strony
     total_results = len(reranked_candidates)
+    has_more = skip + limit < total_results or unevaluated > 0
     paginated_candidates = reranked_candidates[skip : skip + limit]
 
-    summary = await generate_final_summary(query, paginated_candidates[:3])
-    logger.info("Wygenerowano finalne podsumowanie.")
+    # Podsumowanie generowane jest w tle - odpowiedź nie czeka na LLM.
+    # Po upływie terminu, w trybie zdegradowanym lub przy pełnej kolejce podsumowań jest pomijane.
+    # Dotyczy czołówki całego rankingu, nie bieżącej strony - wszystkie strony dzielą jeden token.
+    top_candidates = reranked_candidates[:3]
+    token, summary = None, None
+    if not top_candidates:
+        summary = await generate_final_summary(query, top_candidates)
+        stages["summary"] = "completed"
+    elif degraded or deadline.expired:
+        # Tekst zamiast None - klient nie czeka na podsumowanie, które nie powstanie
+        summary = SUMMARY_SKIPPED_DEGRADED if degraded else SUMMARY_SKIPPED_DEADLINE
+        stages["summary"] = "skipped"
+    else:
+        token = summary_token(query, top_candidates)
+        if summary_store.submit(token, lambda: generate_final_summary(query, top_candidates)) is None:
+            # Pełna kolejka podsumowań (SUMMARY_MAX_QUEUE) - token nie miałby czego zwrócić
+            token, summary = None, SUMMARY_SKIPPED_BUSY
+            stages["summary"] = "skipped"
+        else:
+            summary = summary_store.peek(token)
+            stages["summary"] = "completed" if summary is not None else "deferred"
 
     response_profiles = [
         schemas.SearchResultProfile(
             **c["profile"].__dict__,
             match_score=c["match_score"],
-            reasoning=c["reasoning"]
+            reasoning=c["reasoning"],
+            reranked=c["reranked"]
         ) for c in paginated_candidates
     ]
     
@@ -178,7 +419,10 @@ async def perfected_search_pipeline(db: AsyncSession, query: str, skip: int, lim
         total=total_results,
         page=(skip // limit) + 1,
         limit=limit,
-        items=response_profiles
+        items=response_profiles,
+        has_more=has_more
     )
     
-    return schemas.SearchResponse(summary=summary, profiles=paginated_response)
+    return schemas.SearchResponse(
+        summary=summary, summary_token=token, profiles=paginated_response, degraded=degraded, stages=stages
+    )
@@ -2,18 +2,46 @@
 # core/services.py
 import asyncio
 import hashlib
+import logging
+from datetime import timedelta
 from pathlib import Path
 from fastapi import UploadFile, HTTPException, status
 from sqlalchemy.ext.asyncio import AsyncSession
 # POPRAWKA: Importujemy 'delete' bezpośrednio z sqlalchemy
-from sqlalchemy import func, delete
-from typing import Dict, Any
+from sqlalchemy import delete, insert
+from typing import Dict, Any, Iterable, List, Optional, Set
 
-from . import crud, models, schemas
-from .cv_parser import parse_cv_file
-from langchain_openai import OpenAIEmbeddings
+from . import crud, embedding_models, models, schemas, search_logic, vector_index
+from .config import settings
+from .database import AsyncSessionLocal
+from .experience import effective_experience_months, experience_summary, item_field
+from .llm_gateway import gateway
+from .similar_cache import similar_cache
 
-embeddings_model = OpenAIEmbeddings(model="text-embedding-ada-002")
+logger = logging.getLogger(__name__)
+
+# Referencje do zadań w tle (asyncio trzyma tylko słabe referencje)
+_background_tasks: Set[asyncio.Task] = set()
+
+def build_embedding_text(ai_summary: str, work_experiences: Iterable[Any], projects: Iterable[Any], skills: Iterable[Any]) -> str:
+    """
+    Szablon tekstu do embeddingu profilu. Akceptuje zarówno słowniki z parsera CV,
+    jak i zapisane obiekty ORM - dzięki temu `reembed.py` odtwarza identyczny tekst z bazy.
+    """
+    def describe(item: Any, fields: Iterable[str]) -> str:
+        values = []
+        for name in fields:
+            value = item_field(item, name)
+            if isinstance(value, (list, tuple)):
+                value = ", ".join(str(v) for v in value)
+            if value:
+                values.append(str(value))
+        return " | ".join(values)
+
+    experience = " ".join(describe(w, ("position", "company", "start_date", "end_date", "description", "technologies_used")) for w in work_experiences if w)
+    project_text = " ".join(describe(p, ("name", "description")) for p in projects if p)
+    skill_names = ", ".join(s if isinstance(s, str) else s.name for s in skills)
+    return f"Summary: {ai_summary} Experience: {experience} Projects: {project_text} Skills: {skill_names}"
 
 class UserService:
     @staticmethod
@@ -46,10 +74,25 @@ class UserService:
         user.other_data = parsed_data.get("other_data")
         user.cv_filepath = cv_path
         user.cv_file_hash = cv_hash
+        user.experience_months, user.experience_ongoing_since = experience_summary(parsed_data.get("work_experiences", []))
         
-        context_for_embedding = f"Summary: {user.ai_summary} Experience: {' '.join(str(i) for i in parsed_data.get('work_experiences', []))} Projects: {' '.join(str(i) for i in parsed_data.get('projects', []))} Skills: {', '.join(parsed_data.get('skills', []))}"
-        user.embedding = await embeddings_model.aembed_query(context_for_embedding)
-        user.tsvector_col = func.to_tsvector('english', context_for_embedding)
+        context_for_embedding = build_embedding_text(
+            user.ai_summary,
+            parsed_data.get("work_experiences", []),
+            parsed_data.get("projects", []),
+            parsed_data.get("skills", []),
+        )
+        models_state = await embedding_models.current(db)
+        vectors = await embedding_models.embed_profile(context_for_embedding, models_state)
+        # Blokada do commitu: `reembed.py --swap` nie zamieni kolumn między policzeniem a zapisem
+        # wektorów, a jeśli zamiana (lub start przeliczania) nastąpiła w międzyczasie - liczymy ponownie
+        locked_state = await embedding_models.lock_for_profile_write(db)
+        if locked_state != models_state:
+            models_state = locked_state
+            vectors = await embedding_models.embed_profile(context_for_embedding, models_state)
+        # Podczas przeliczania (`--target shadow`) profil dostaje od razu wektory obu modeli
+        user.embedding, user.embedding_shadow = vectors
+        # tsvector_col jest utrzymywany przez triggery w bazie (core/fts.py)
 
         # Commit podstawowych danych, aby uzyskać ID
         await db.commit()
@@ -75,13 +118,91 @@ class UserService:
                     db.add(db_item)
 
         skill_objects = [await crud.get_or_create_skill(db, s) for s in parsed_data.get("skills", [])]
-        user.skills = skill_objects
+        # Jedna instrukcja DELETE i jedna INSERT zamiast operacji kolekcji ORM wiersz po wierszu -
+        # trigger FTS (FOR EACH STATEMENT) przelicza tsvector profilu raz na instrukcję
+        await db.execute(delete(models.user_skills_table).where(models.user_skills_table.c.user_id == user.id))
+        skill_ids = list(dict.fromkeys(skill.id for skill in skill_objects))
+        if skill_ids:
+            await db.execute(insert(models.user_skills_table).values(
+                [{"user_id": user.id, "skill_id": skill_id} for skill_id in skill_ids]
+            ))
         
         await db.commit()
         await db.refresh(user)
+
+        vector_index.notify_upsert(
+            user.id, user.embedding, user.experience_months, models_state.active, user.experience_ongoing_since
+        )
+        similar_cache.invalidate(user.id)
+        SavedSearchService.schedule_profile_evaluation(user.id)
         
         return user
 
+class SimilarCandidatesService:
+    """
+    Kandydaci podobni do wskazanego profilu. Wektorem zapytania jest zapisany `users.embedding`,
+    więc nie ma wywołań LLM ani API embeddingów; ranking wektorowy może być połączony (RRF)
+    z rankingiem pokrycia umiejętności.
+    """
+    @staticmethod
+    def _skill_overlap(probe_skills: Set[str], user: models.User) -> float:
+        skills = {s.name.lower() for s in user.skills}
+        return len(skills & probe_skills) / len(skills | probe_skills) if skills and probe_skills else 0.0
+
+    @staticmethod
+    async def find_similar(
+        db: AsyncSession, user_id: int, limit: int,
+        required_skills: Optional[List[str]] = None, use_skills: bool = True
+    ) -> List[schemas.SimilarCandidate]:
+        required_skills = required_skills or []
+        variant = (limit, tuple(sorted(s.lower() for s in required_skills)), use_skills)
+        cached = similar_cache.get(user_id, variant)
+        if cached is not None:
+            return cached
+
+        probe = await crud.get_user_by_id(db, user_id=user_id)
+        if not probe:
+            raise HTTPException(status.HTTP_404_NOT_FOUND, "User not found.")
+        # Wektor profilu razem z jego modelem - porównywany tylko z wektorami tego samego modelu
+        probe_embedding, embedding_model = await crud.get_user_embedding(db, user_id)
+        if probe_embedding is None:
+            raise HTTPException(status.HTTP_409_CONFLICT, "Profile has no embedding yet.")
+
+        # Zapas ponad `limit` - część sąsiadów odpadnie na filtrze umiejętności
+        pool_size = limit * settings.SIMILAR_CANDIDATE_POOL_FACTOR
+        index = vector_index.get_ready_index()
+        if index is not None and index.model == embedding_model:
+            neighbour_ids = await asyncio.to_thread(index.search, probe_embedding, pool_size + 1)
+            vector_ids = [i for i in neighbour_ids if i != user_id][:pool_size]
+        else:
+            vector_ids = await crud.vector_search_user_ids(
+                db, query_embedding=probe_embedding, limit=pool_size, exclude_user_id=user_id,
+                embedding_model=embedding_model
+            )
+        candidates = await crud.get_users_by_ids_with_filters(db, user_ids=vector_ids, required_skills=required_skills)
+
+        k = 60
+        scores: Dict[int, float] = {c.id: 1.0 / (k + rank) for rank, c in enumerate(candidates)}
+        probe_skills = {s.name.lower() for s in probe.skills}
+        if use_skills and probe_skills:
+            overlap = {c.id: SimilarCandidatesService._skill_overlap(probe_skills, c) for c in candidates}
+            # Sortowanie stabilne - remisy zachowują kolejność wektorową
+            for rank, c in enumerate(sorted(candidates, key=lambda c: overlap[c.id], reverse=True)):
+                if overlap[c.id] > 0:
+                    scores[c.id] += 1.0 / (k + rank)
+
+        ranked = sorted(candidates, key=lambda c: scores[c.id], reverse=True)[:limit]
+        max_score = max(scores.values(), default=0.0) or 1.0
+        results = [
+            schemas.SimilarCandidate(
+                **c.__dict__,
+                match_score=round(100.0 * scores[c.id] / max_score, 1),
+                shared_skills=sorted(s.name for s in c.skills if s.name.lower() in probe_skills),
+            ) for c in ranked
+        ]
+        similar_cache.set(user_id, variant, results)
+        return results
+
 class CVService:
     @staticmethod
     async def process_uploaded_cv(db: AsyncSession, file: UploadFile, upload_dir: Path):
@@ -97,9 +218,148 @@ class CVService:
             buffer.write(contents)
             
         try:
+            # Import leniwy - moduł parsera (i jego zależności) nie trafia do grafu importów /search
+            from .cv_parser import parse_cv_file
             parsed_data = await asyncio.to_thread(parse_cv_file, str(file_path))
         except Exception as e:
             file_path.unlink(missing_ok=True)
             raise HTTPException(status.HTTP_500_INTERNAL_SERVER_ERROR, f"Błąd parsowania CV: {e}")
             
         return await UserService.create_or_update_user_from_cv(db, parsed_data, str(file_path), file_hash)
+
+
+class SavedSearchService:
+    """
+    Zapisane wyszukiwania projektów rekrutacyjnych. Korpus oceniany jest tylko raz,
+    przy tworzeniu wyszukiwania; później oceniane są wyłącznie nowe lub zmienione profile.
+    """
+    @staticmethod
+    def _query(saved_search: models.SavedSearch) -> search_logic.QueryDeconstruction:
+        return search_logic.QueryDeconstruction(**saved_search.deconstructed_query)
+
+    @staticmethod
+    def _passes_filters(dq: search_logic.QueryDeconstruction, user: models.User) -> bool:
+        """Te same twarde filtry co w wyszukiwaniu hybrydowym: wymagane umiejętności i doświadczenie."""
+        skills = {s.name.lower() for s in user.skills}
+        if any(skill.lower() not in skills for skill in dq.required_skills):
+            return False
+        # Nieznane doświadczenie (NULL) nie odrzuca profilu - ocenia go LLM
+        experience = effective_experience_months(user.experience_months, user.experience_ongoing_since)
+        if dq.experience_years and experience is not None and experience < dq.experience_years * 12:
+            return False
+        return True
+
+    @staticmethod
+    async def create(db: AsyncSession, project_id: int, data: schemas.SavedSearchCreate) -> models.SavedSearch:
+        project = await db.get(models.RecruitmentProject, project_id)
+        if not project:
+            raise HTTPException(status.HTTP_404_NOT_FOUND, "Recruitment project not found.")
+        embedding_model = (await embedding_models.current(db)).active
+        # Transakcje na primary nie pozostają otwarte podczas wywołań LLM
+        await db.commit()
+
+        dq = await search_logic.deconstruct_query(data.query)
+        query_embedding = await gateway.aembed_query(dq.semantic_query, embedding_model)
+
+        # Jednorazowa ocena całego korpusu - ten sam potok co /search
+        run_started = await crud.db_now(db)
+        candidates = await search_logic.hybrid_search(
+            db, dq, query_embedding=query_embedding, embedding_model=embedding_model
+        )
+        await db.commit()
+        scored, _ = await search_logic.rerank_candidates(
+            data.query, candidates, dq, needed=settings.SAVED_SEARCH_INITIAL_LIMIT
+        )
+
+        # Wyszukiwanie zapisywane dopiero z gotowymi ocenami - jedna krótka transakcja
+        saved_search = models.SavedSearch(
+            project_id=project_id,
+            query=data.query,
+            deconstructed_query=dq.model_dump(),
+            query_embedding=query_embedding,
+            query_embedding_model=embedding_model,
+            min_score=data.min_score,
+            last_run_at=run_started,
+        )
+        db.add(saved_search)
+        await db.flush()
+        await crud.upsert_saved_search_results(db, saved_search, scored)
+        await db.commit()
+        await db.refresh(saved_search)
+        return saved_search
+
+    @staticmethod
+    async def run_incremental(db: AsyncSession, saved_search_id: int) -> schemas.SavedSearchRunResult:
+        """Ocenia tylko profile zmienione od ostatniego przebiegu - O(nowe CV), nie O(baza)."""
+        saved_search = await db.get(models.SavedSearch, saved_search_id)
+        if not saved_search:
+            raise HTTPException(status.HTTP_404_NOT_FOUND, "Saved search not found.")
+        await db.commit()
+
+        dq = SavedSearchService._query(saved_search)
+        since = None
+        if saved_search.last_run_at is not None:
+            since = saved_search.last_run_at - timedelta(seconds=settings.SAVED_SEARCH_RUN_OVERLAP_SECONDS)
+        evaluated, qualified = 0, 0
+        # Osobna sesja do odczytu strumieniowego (jak w reembed.py) - zapisy idą przez `db`,
+        # zatwierdzane po każdej partii. Profile, których bieżąca wersja CV była już oceniona
+        # (np. przez ocenę w tle po uploadzie, w zapasie czasu albo gdy updated_at zmienił tylko
+        # reembed.py), nie trafiają ponownie do LLM.
+        async with AsyncSessionLocal() as read_db:
+            # Czas bazy sprzed otwarcia kursora: profile zatwierdzone później obejmie kolejny przebieg
+            run_started = await crud.db_now(read_db)
+            async for users in crud.stream_users_updated_since(
+                read_db, since=since,
+                required_skills=dq.required_skills,
+                min_experience_months=dq.experience_years * 12 if dq.experience_years else None,
+                unscored_for_saved_search_id=saved_search.id,
+                batch_size=settings.SAVED_SEARCH_BATCH_SIZE,
+            ):
+                batch = [{"profile": u, "rrf_score": 0.0} for u in users]
+                scored = await search_logic.llm_score_candidates(saved_search.query, batch, profile="rerank")
+                qualified += await crud.upsert_saved_search_results(db, saved_search, scored)
+                await db.commit()
+                evaluated += len(users)
+
+        saved_search.last_run_at = run_started
+        await db.commit()
+        return schemas.SavedSearchRunResult(saved_search_id=saved_search.id, evaluated=evaluated, qualified=qualified)
+
+    @staticmethod
+    async def evaluate_profile(db: AsyncSession, user: models.User) -> int:
+        """Ocenia jeden (nowy lub zaktualizowany) profil względem wszystkich aktywnych wyszukiwań."""
+        saved_searches = await crud.get_active_saved_searches(db)
+        scored_versions = await crud.get_scored_profile_versions(db, user.id)
+        to_score: List[models.SavedSearch] = [
+            s for s in saved_searches
+            if SavedSearchService._passes_filters(SavedSearchService._query(s), user)
+            # Ten sam plik CV był już oceniony względem tego wyszukiwania
+            and not (s.id in scored_versions and scored_versions[s.id] == user.cv_file_hash)
+        ]
+        results = await asyncio.gather(*[
+            search_logic.llm_score_candidates(s.query, [{"profile": user, "rrf_score": 0.0}], profile="rerank")
+            for s in to_score
+        ])
+        qualified = 0
+        for saved_search, scored in zip(to_score, results):
+            qualified += await crud.upsert_saved_search_results(db, saved_search, scored)
+        await db.commit()
+        return qualified
+
+    @staticmethod
+    async def _evaluate_profile_in_background(user_id: int):
+        try:
+            async with AsyncSessionLocal() as db:
+                user = await crud.get_user_by_id(db, user_id=user_id)
+                if user:
+                    qualified = await SavedSearchService.evaluate_profile(db, user)
+                    logger.info(f"Profil {user_id} dodany do {qualified} projektów przez zapisane wyszukiwania.")
+        except Exception as e:
+            logger.error(f"Błąd oceny profilu {user_id} względem zapisanych wyszukiwań: {e}")
+
+    @staticmethod
+    def schedule_profile_evaluation(user_id: int):
+        """Ocena w tle - upload CV nie czeka na wywołania LLM dla zapisanych wyszukiwań."""
+        task = asyncio.create_task(SavedSearchService._evaluate_profile_in_background(user_id))
+        _background_tasks.add(task)
+        task.add_done_callback(_background_tasks.discard)
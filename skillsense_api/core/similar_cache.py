@@ -0,0 +1,58 @@
+# core/similar_cache.py
+"""
+Cache wyników /users/{id}/similar.
+
+Wpisy są grupowane per ID profilu wzorcowego, dzięki czemu ponowne wgranie CV
+(`create_or_update_user_from_cv`) unieważnia wszystkie warianty zapytania dla tego
+profilu jednym wywołaniem. Wpisy wygasają po SIMILAR_CACHE_TTL_SECONDS - to ogranicza
+nieaktualność wyników zawierających profile zmienione na innych workerach.
+
+UWAGA: Cache jest lokalny dla procesu (jak core/summary_store.py).
+"""
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+from .config import settings
+
+
+class SimilarCandidatesCache:
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        # user_id -> {klucz wariantu: (czas wygaśnięcia, wynik)}, w kolejności LRU
+        self._entries: "OrderedDict[int, Dict[Hashable, Tuple[float, Any]]]" = OrderedDict()
+        self._size = 0
+
+    def get(self, user_id: int, variant: Hashable) -> Optional[Any]:
+        variants = self._entries.get(user_id)
+        if not variants or variant not in variants:
+            return None
+        expires_at, value = variants[variant]
+        if expires_at <= time.monotonic():
+            del variants[variant]
+            self._size -= 1
+            return None
+        self._entries.move_to_end(user_id)
+        return value
+
+    def set(self, user_id: int, variant: Hashable, value: Any) -> None:
+        variants = self._entries.setdefault(user_id, {})
+        if variant not in variants:
+            self._size += 1
+        variants[variant] = (time.monotonic() + self.ttl_seconds, value)
+        self._entries.move_to_end(user_id)
+        while self._size > self.max_entries and len(self._entries) > 1:
+            _, evicted = self._entries.popitem(last=False)
+            self._size -= len(evicted)
+
+    def invalidate(self, user_id: int) -> None:
+        variants = self._entries.pop(user_id, None)
+        if variants:
+            self._size -= len(variants)
+
+
+similar_cache = SimilarCandidatesCache(
+    max_entries=settings.SIMILAR_CACHE_MAX_ENTRIES,
+    ttl_seconds=settings.SIMILAR_CACHE_TTL_SECONDS,
+)
@@ -0,0 +1,163 @@
+# core/summary_store.py
+"""
+Asynchroniczne generowanie i cache podsumowań wyników wyszukiwania.
+
+Podsumowanie LLM nie blokuje już odpowiedzi /search - potok zwraca token,
+a podsumowanie jest generowane w tle i odbierane przez /search/summary/{token}.
+Klucz cache: (zapytanie, ID najlepszych kandydatów, wersje ich profili),
+więc powtórzone zapytania i kolejne strony z tą samą czołówką nie generują go ponownie.
+
+Zadania w tle trwają dłużej niż slot admission control (core/admission.py), dlatego
+generowanie ma własny semafor i ograniczoną kolejkę - przy jej zapełnieniu `submit`
+nie uruchamia nowego zadania, a potok pomija podsumowanie.
+
+Zadania działają w procesie, który obsłużył /search, ale ich stan trafia do tabeli
+`search_summaries` (NULL w trakcie generowania, potem tekst). Token z innego workera,
+usunięty z lokalnego cache lub sprzed restartu jest więc rozwiązywany z bazy.
+"""
+import asyncio
+import hashlib
+import logging
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import crud
+from .config import settings
+from .database import AsyncSessionLocal
+
+logger = logging.getLogger(__name__)
+
+SummaryFactory = Callable[[], Awaitable[str]]
+
+
+def summary_token(query: str, top_candidates: List[Dict[str, Any]]) -> str:
+    """Deterministyczny token podsumowania; wersją profilu jest hash jego pliku CV."""
+    parts = [query.strip().lower()]
+    parts += [f"{c['profile'].id}:{c['profile'].cv_file_hash or ''}" for c in top_candidates]
+    return hashlib.sha256("|".join(parts).encode("utf-8")).hexdigest()
+
+
+class SummaryStore:
+    def __init__(self, max_entries: int, max_concurrent: int, max_queue: int):
+        self.max_entries = max_entries
+        self.max_queue = max_queue
+        self._tasks: "OrderedDict[str, asyncio.Task]" = OrderedDict()
+        self._semaphore = asyncio.Semaphore(max_concurrent)
+        # Zadania czekające na semafor (także te, które jeszcze nie wystartowały)
+        self._queued: Set[asyncio.Task] = set()
+
+    @property
+    def waiting(self) -> int:
+        return len(self._queued)
+
+    @property
+    def saturated(self) -> bool:
+        return self.waiting >= self.max_queue
+
+    async def _run(self, token: str, factory: SummaryFactory) -> str:
+        await self._persist(lambda db: crud.save_search_summary(db, token, None))
+        await self._semaphore.acquire()
+        self._queued.discard(asyncio.current_task())
+        try:
+            summary = await factory()
+        except BaseException:
+            await self._persist(lambda db: crud.delete_pending_search_summary(db, token))
+            raise
+        finally:
+            self._semaphore.release()
+        await self._persist(lambda db: self._save_ready(db, token, summary))
+        return summary
+
+    @staticmethod
+    async def _save_ready(db: AsyncSession, token: str, summary: str):
+        await crud.save_search_summary(db, token, summary)
+        await crud.purge_search_summaries(db, settings.SUMMARY_RETENTION_HOURS)
+
+    @staticmethod
+    async def _persist(write: Callable[[AsyncSession], Awaitable[None]]):
+        """Zapis do search_summaries; błąd bazy nie przerywa generowania - token działa wtedy lokalnie."""
+        try:
+            async with AsyncSessionLocal() as db:
+                await write(db)
+                await db.commit()
+        except Exception as e:
+            logger.warning(f"Nie udało się zapisać stanu podsumowania w bazie: {e}")
+
+    def submit(self, token: str, factory: SummaryFactory) -> Optional[asyncio.Task]:
+        """
+        Zwraca istniejące zadanie dla tokenu lub uruchamia generowanie w tle.
+        None, gdy kolejka podsumowań jest pełna - zadanie nie zostało uruchomione.
+        """
+        task = self._tasks.get(token)
+        # Anulowane lub nieudane zadanie jest uruchamiane ponownie (cancelled() przed exception(),
+        # bo exception() na anulowanym zadaniu rzuca CancelledError)
+        if task is not None and not (task.done() and (task.cancelled() or task.exception() is not None)):
+            self._tasks.move_to_end(token)
+            return task
+
+        if self.saturated:
+            return None
+        task = asyncio.create_task(self._run(token, factory))
+        self._queued.add(task)
+        task.add_done_callback(lambda t, token=token: self._on_done(token, t))
+        self._tasks[token] = task
+        while len(self._tasks) > self.max_entries:
+            self._tasks.popitem(last=False)
+        return task
+
+    def _on_done(self, token: str, task: asyncio.Task):
+        self._queued.discard(task)
+        if task.cancelled() or task.exception() is not None:
+            logger.error(f"Generowanie podsumowania {token[:12]} nieudane: {task.exception() if not task.cancelled() else 'anulowane'}")
+
+    def peek(self, token: str) -> Optional[str]:
+        """Zwraca gotowe podsumowanie bez czekania (None, jeśli jeszcze się generuje)."""
+        task = self._tasks.get(token)
+        if task is None or not task.done() or task.cancelled() or task.exception() is not None:
+            return None
+        return task.result()
+
+    async def resolve(self, token: str, wait: bool, timeout: float) -> Tuple[str, Optional[str]]:
+        """
+        Zwraca (status, podsumowanie), gdzie status to 'ready', 'pending', 'failed' lub 'unknown'.
+        """
+        task = self._tasks.get(token)
+        if task is None:
+            return await self._resolve_shared(token, wait, timeout)
+        if wait and not task.done():
+            try:
+                await asyncio.wait_for(asyncio.shield(task), timeout=timeout)
+            except asyncio.TimeoutError:
+                return "pending", None
+            except Exception:
+                pass
+        if not task.done():
+            return "pending", None
+        if task.cancelled() or task.exception() is not None:
+            return "failed", None
+        return "ready", task.result()
+
+    async def _resolve_shared(self, token: str, wait: bool, timeout: float) -> Tuple[str, Optional[str]]:
+        """Token spoza lokalnego cache - stan z tabeli search_summaries, odpytywanej do `timeout`."""
+        loop = asyncio.get_running_loop()
+        wait_until = loop.time() + (timeout if wait else 0.0)
+        while True:
+            async with AsyncSessionLocal() as db:
+                row = await crud.get_search_summary(db, token)
+            if row is None:
+                return "unknown", None
+            if row.summary is not None:
+                return "ready", row.summary
+            remaining = wait_until - loop.time()
+            if remaining <= 0:
+                return "pending", None
+            await asyncio.sleep(min(settings.SUMMARY_POLL_INTERVAL_SECONDS, remaining))
+
+
+summary_store = SummaryStore(
+    max_entries=settings.SUMMARY_CACHE_MAX_ENTRIES,
+    max_concurrent=settings.SUMMARY_MAX_CONCURRENCY,
+    max_queue=settings.SUMMARY_MAX_QUEUE,
+)
@@ -0,0 +1,366 @@
+# core/vector_index.py
+"""
+Opcjonalny indeks wektorowy w pamięci procesu.
+
+Dla baz do kilkuset tysięcy profili skanowanie macierzy NumPy jest szybsze niż
+zapytanie `vector_search_user_ids` do Postgresa. Indeks trzyma wszystkie `users.embedding`
+w ciągłej macierzy float32 (n x 1536) wraz z tablicą ID, a baza danych służy
+wyłącznie do "nawodnienia" (hydration) wybranych profili.
+
+Tryby:
+- "exact": dokładne top-k (odległość L2, jak `l2_distance` w pgvector),
+- "ivf":   przybliżone top-k - skan tylko `nprobe` najbliższych klastrów k-means.
+
+Świeżość: `create_or_update_user_from_cv` wywołuje `upsert` w bieżącym procesie,
+a pętla w tle odpytuje kolumnę `users.updated_at`, aby przechwycić zmiany z innych workerów.
+Indeks pamięta model embeddingów swoich wektorów (`model`); po zamianie kolumn
+(`reembed.py --swap`) jest przeładowywany, a do tego czasu zapytania nowym modelem idą do bazy.
+
+Włączany przez VECTOR_INDEX_ENABLED=true (wymaga pakietu numpy).
+"""
+import asyncio
+import logging
+import threading
+from datetime import date, datetime, timedelta
+from typing import List, Optional, Sequence
+
+from sqlalchemy import select
+
+from .config import settings
+from .experience import month_index
+
+# numpy importowane leniwie (_import_numpy) - przy wyłączonym indeksie nie trafia do grafu importów /search
+np = None
+
+
+def _import_numpy() -> bool:
+    global np
+    if np is None:
+        try:
+            import numpy
+        except ImportError:  # numpy jest zależnością opcjonalną
+            return False
+        np = numpy
+    return True
+
+logger = logging.getLogger(__name__)
+
+
+class InMemoryVectorIndex:
+    def __init__(self, dim: int = 1536, mode: str = "exact", nlist: int = 256, nprobe: int = 8):
+        if not _import_numpy():
+            raise RuntimeError("InMemoryVectorIndex wymaga pakietu numpy.")
+        self.dim = dim
+        self.mode = mode
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self._lock = threading.Lock()
+        self._size = 0
+        self._ids = np.empty(0, dtype=np.int64)
+        self._matrix = np.empty((0, dim), dtype=np.float32)
+        self._norms = np.empty(0, dtype=np.float32)
+        self._experience = np.empty(0, dtype=np.int32)  # -1 = nieznane (jak NULL w SQL)
+        self._ongoing_since = np.empty(0, dtype=np.int32)  # indeks miesiąca trwającego etatu, -1 = brak
+        self._positions: dict = {}  # user_id -> wiersz macierzy
+        self._centroids = None
+        self._assignments = np.empty(0, dtype=np.int32)
+        self.watermark: Optional[datetime] = None
+        self.model: Optional[str] = None  # model embeddingów wektorów w indeksie
+        self.ready = False
+
+    def __len__(self) -> int:
+        return self._size
+
+    # --- Budowa i aktualizacja ---
+
+    def build(self, ids: Sequence[int], vectors, experience_months: Optional[Sequence[Optional[int]]] = None,
+              ongoing_since: Optional[Sequence[Optional[date]]] = None) -> None:
+        """
+        Zastępuje zawartość indeksu (pełne ładowanie). `experience_months` i `ongoing_since`
+        jak kolumny `users.experience_months` i `users.experience_ongoing_since`.
+        """
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(-1, self.dim)
+        size = len(vectors)
+        # Zapas na nowe profile - pierwszy upsert po pełnym ładowaniu nie kopiuje całej macierzy
+        capacity = size + max(1024, size // 8)
+        matrix = np.zeros((capacity, self.dim), dtype=np.float32)
+        matrix[:size] = vectors
+        buffers = {
+            "_ids": (np.int64, ids),
+            "_norms": (np.float32, np.einsum("ij,ij->i", vectors, vectors)),
+            "_experience": (np.int32, [-1 if m is None else m for m in (experience_months or [None] * size)]),
+            "_ongoing_since": (np.int32, [_month_or_missing(d) for d in (ongoing_since or [None] * size)]),
+            "_assignments": (np.int32, np.zeros(size)),
+        }
+        with self._lock:
+            self._matrix = matrix
+            for name, (dtype, values) in buffers.items():
+                buffer = np.zeros(capacity, dtype=dtype)
+                buffer[:size] = np.asarray(values, dtype=dtype)
+                setattr(self, name, buffer)
+            self._size = size
+            self._positions = {int(uid): row for row, uid in enumerate(self._ids[:size])}
+            self._centroids = None
+            if self.mode == "ivf" and self._size >= self.nlist:
+                self._train_ivf()
+
+    def upsert(self, user_id: int, vector, experience_months: Optional[int] = None,
+               ongoing_since: Optional[date] = None) -> None:
+        vec = np.asarray(vector, dtype=np.float32).reshape(self.dim)
+        with self._lock:
+            row = self._positions.get(user_id)
+            if row is None:
+                row = self._size
+                self._grow(row + 1)
+                self._ids[row] = user_id
+                self._positions[user_id] = row
+                self._size += 1
+            self._matrix[row] = vec
+            self._norms[row] = float(vec @ vec)
+            self._experience[row] = -1 if experience_months is None else experience_months
+            self._ongoing_since[row] = _month_or_missing(ongoing_since)
+            if self._centroids is not None:
+                self._assignments[row] = _nearest_centroids(self._centroids, vec[None, :], 1)[0, 0]
+
+    def _grow(self, required: int) -> None:
+        """
+        Amortyzowane powiększanie buforów o 25% - przy setkach tysięcy wektorów podwajanie
+        kopiowałoby gigabajty pod blokadą. Trwające wyszukiwania korzystają ze starych buforów.
+        """
+        capacity = len(self._ids)
+        if required <= capacity:
+            return
+        new_capacity = max(required, capacity + capacity // 4, 1024)
+        for name, shape, dtype in (("_ids", (new_capacity,), np.int64),
+                                   ("_matrix", (new_capacity, self.dim), np.float32),
+                                   ("_norms", (new_capacity,), np.float32),
+                                   ("_experience", (new_capacity,), np.int32),
+                                   ("_ongoing_since", (new_capacity,), np.int32),
+                                   ("_assignments", (new_capacity,), np.int32)):
+            old = getattr(self, name)
+            grown = np.zeros(shape, dtype=dtype)
+            grown[:len(old)] = old
+            setattr(self, name, grown)
+
+    def _train_ivf(self, iterations: int = 10) -> None:
+        """Prosty k-means (Lloyd) na próbce wektorów; centroidy wyznaczają listy IVF."""
+        rng = np.random.default_rng(0)
+        data = self._matrix[:self._size]
+        sample = data[rng.choice(self._size, size=min(self._size, self.nlist * 40), replace=False)]
+        centroids = sample[rng.choice(len(sample), size=self.nlist, replace=False)].copy()
+        for _ in range(iterations):
+            labels = _argmin_l2(sample, centroids)
+            for c in range(self.nlist):
+                members = sample[labels == c]
+                if len(members):
+                    centroids[c] = members.mean(axis=0)
+        self._centroids = centroids
+        assignments = np.zeros(len(self._ids), dtype=np.int32)
+        for start in range(0, self._size, 8192):
+            end = min(start + 8192, self._size)
+            assignments[start:end] = _argmin_l2(data[start:end], centroids)
+        self._assignments = assignments
+
+    # --- Wyszukiwanie ---
+
+    def search(self, query, k: int = 50, min_experience_months: Optional[int] = None) -> List[int]:
+        return self.search_batch(np.asarray(query, dtype=np.float32)[None, :], k, min_experience_months)[0]
+
+    def search_batch(self, queries, k: int = 50, min_experience_months: Optional[int] = None) -> List[List[int]]:
+        """
+        Top-k ID (rosnąco wg odległości L2) dla macierzy zapytań (m x dim).
+        `min_experience_months` działa jak `crud.experience_at_least`: doświadczenie na dziś
+        (z trwającym etatem) >= X, a profile o nieznanym doświadczeniu nie są odrzucane.
+        """
+        queries = np.ascontiguousarray(np.asarray(queries, dtype=np.float32).reshape(-1, self.dim))
+        # Pod blokadą tylko migawka referencji (widoki, bez kopiowania); obliczenia poza nią,
+        # więc wyszukiwania działają równolegle. `upsert` nadpisuje pojedyncze wiersze na miejscu,
+        # a `_grow` podmienia bufory - migawka pozostaje spójna co do rozmiaru.
+        with self._lock:
+            size = self._size
+            matrix, norms, ids = self._matrix[:size], self._norms[:size], self._ids[:size]
+            experience, ongoing_since = self._experience[:size], self._ongoing_since[:size]
+            assignments, centroids = self._assignments[:size], self._centroids
+        if size == 0:
+            return [[] for _ in range(len(queries))]
+        eligible = None
+        if min_experience_months:
+            ongoing = np.where(ongoing_since >= 0, month_index(date.today()) - ongoing_since + 1, 0)
+            eligible = (experience < 0) | (experience + ongoing >= min_experience_months)
+
+        if centroids is None:
+            # ||x - q||^2 = ||x||^2 - 2 x·q + ||q||^2 (ostatni składnik nie zmienia kolejności)
+            dists = norms[None, :] - 2.0 * (queries @ matrix.T)
+            if eligible is not None:
+                # Maska zamiast matrix[rows] - bez kopiowania macierzy przy każdym zapytaniu
+                dists[:, ~eligible] = np.inf
+            return [_top_k(row, ids, k) for row in dists]
+
+        probes = _nearest_centroids(centroids, queries, self.nprobe)
+        results = []
+        for q, probe in zip(queries, probes):
+            mask = np.isin(assignments, probe)
+            if eligible is not None:
+                mask &= eligible
+            rows = np.flatnonzero(mask)
+            dists = norms[rows] - 2.0 * (matrix[rows] @ q)
+            results.append(_top_k(dists, ids[rows], k))
+        return results
+
+
+def _month_or_missing(value: Optional[date]) -> int:
+    return -1 if value is None else month_index(value)
+
+
+def _nearest_centroids(centroids, queries, nprobe: int):
+    c_norms = np.einsum("ij,ij->i", centroids, centroids)
+    dists = c_norms[None, :] - 2.0 * (queries @ centroids.T)
+    nprobe = min(nprobe, len(centroids))
+    return np.argpartition(dists, nprobe - 1, axis=1)[:, :nprobe]
+
+
+def _argmin_l2(data, centroids):
+    c_norms = np.einsum("ij,ij->i", centroids, centroids)
+    return np.argmin(c_norms[None, :] - 2.0 * (data @ centroids.T), axis=1)
+
+
+def _top_k(dists, ids, k: int) -> List[int]:
+    if len(dists) > k:
+        part = np.argpartition(dists, k - 1)[:k]
+    else:
+        part = np.arange(len(dists))
+    order = part[np.argsort(dists[part])]
+    # Wiersze odfiltrowane maską (+inf) nie trafiają do wyniku, nawet gdy kwalifikujących się jest < k
+    order = order[np.isfinite(dists[order])]
+    return [int(i) for i in ids[order]]
+
+
+# --- Zarządzanie indeksem w procesie aplikacji ---
+
+vector_index: Optional[InMemoryVectorIndex] = None
+_refresh_task: Optional[asyncio.Task] = None
+
+
+def get_ready_index() -> Optional[InMemoryVectorIndex]:
+    """Zwraca indeks, jeśli jest włączony i załadowany; w przeciwnym razie None (fallback do bazy)."""
+    if vector_index is not None and vector_index.ready:
+        return vector_index
+    return None
+
+
+def notify_upsert(user_id: int, embedding, experience_months: Optional[int] = None, model: Optional[str] = None,
+                  experience_ongoing_since: Optional[date] = None) -> None:
+    """Wywoływane po zapisie embeddingu profilu (policzonego modelem `model`) w tym procesie."""
+    if vector_index is not None and vector_index.ready and embedding is not None and model == vector_index.model:
+        vector_index.upsert(user_id, embedding, experience_months, experience_ongoing_since)
+
+
+async def _fetch_embeddings(since: Optional[datetime]):
+    from .database import AsyncReadSessionLocal
+    from . import embedding_models, models
+
+    # Model odczytany w tej samej instrukcji co wektory - zawsze zgodny z ich zawartością
+    stmt = (
+        select(models.User.id, models.User.embedding, models.User.experience_months,
+               models.User.experience_ongoing_since, models.User.updated_at, embedding_models.active_model_column())
+        .where(models.User.embedding.isnot(None))
+        .execution_options(yield_per=5000)
+    )
+    if since is not None:
+        stmt = stmt.where(models.User.updated_at > since)
+    async with AsyncReadSessionLocal() as db:
+        result = await db.stream(stmt)
+        async for partition in result.partitions():
+            yield partition
+
+
+async def _active_model() -> str:
+    from .database import AsyncReadSessionLocal
+    from . import embedding_models
+
+    async with AsyncReadSessionLocal() as db:
+        return (await embedding_models.current(db, refresh=True)).active
+
+
+async def load_index() -> None:
+    """Pełne ładowanie wszystkich embeddingów z bazy do pamięci."""
+    index = InMemoryVectorIndex(
+        mode=settings.VECTOR_INDEX_MODE,
+        nlist=settings.VECTOR_INDEX_NLIST,
+        nprobe=settings.VECTOR_INDEX_NPROBE,
+    )
+    ids, vectors, experience, ongoing, watermark, models_seen = [], [], [], [], None, set()
+    async for rows in _fetch_embeddings(since=None):
+        for user_id, embedding, experience_months, ongoing_since, updated_at, model in rows:
+            models_seen.add(model)
+            ids.append(user_id)
+            vectors.append(np.asarray(embedding, dtype=np.float32))
+            experience.append(experience_months)
+            ongoing.append(ongoing_since)
+            if updated_at and (watermark is None or updated_at > watermark):
+                watermark = updated_at
+    if len(models_seen) > 1:
+        # Zamiana kolumn w trakcie ładowania (partie z różnych instrukcji kursora) - od nowa
+        logger.info("Model embeddingów zmienił się podczas ładowania indeksu - ładuję ponownie.")
+        return await load_index()
+    await asyncio.to_thread(
+        index.build, ids, np.stack(vectors) if vectors else np.empty((0, index.dim)), experience, ongoing
+    )
+    index.watermark = watermark
+    index.model = models_seen.pop() if models_seen else await _active_model()
+    index.ready = True
+
+    global vector_index
+    vector_index = index
+    logger.info(f"Indeks wektorowy załadowany: {len(index)} profili (tryb: {index.mode}, model: {index.model}).")
+
+
+async def refresh_index() -> int:
+    """Dociąga profile zmienione od ostatniego odświeżenia (z zapasem na opóźnione commity)."""
+    index = vector_index
+    if index is None or not index.ready:
+        return 0
+    # Zamiana kolumn nie zmienia updated_at - wykrywamy ją po modelu i przeładowujemy całość
+    if await _active_model() != index.model:
+        await load_index()
+        return len(vector_index)
+    since = index.watermark - timedelta(seconds=settings.VECTOR_INDEX_REFRESH_OVERLAP_SECONDS) if index.watermark else None
+    count = 0
+    async for rows in _fetch_embeddings(since=since):
+        for user_id, embedding, experience_months, ongoing_since, updated_at, model in rows:
+            if model != index.model:
+                await load_index()
+                return len(vector_index)
+            index.upsert(user_id, embedding, experience_months, ongoing_since)
+            if updated_at and (index.watermark is None or updated_at > index.watermark):
+                index.watermark = updated_at
+            count += 1
+    return count
+
+
+async def _refresh_loop() -> None:
+    while True:
+        await asyncio.sleep(settings.VECTOR_INDEX_REFRESH_SECONDS)
+        try:
+            await refresh_index()
+        except Exception as e:
+            logger.error(f"Błąd odświeżania indeksu wektorowego: {e}")
+
+
+async def start() -> None:
+    """Ładuje indeks i uruchamia pętlę odświeżania (o ile VECTOR_INDEX_ENABLED)."""
+    global _refresh_task
+    if not settings.VECTOR_INDEX_ENABLED:
+        return
+    if not _import_numpy():
+        logger.warning("VECTOR_INDEX_ENABLED=true, ale numpy nie jest zainstalowane - używam wyszukiwania w bazie.")
+        return
+    await load_index()
+    _refresh_task = asyncio.create_task(_refresh_loop())
+
+
+async def stop() -> None:
+    global _refresh_task
+    if _refresh_task is not None:
+        _refresh_task.cancel()
+        _refresh_task = None
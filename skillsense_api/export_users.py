@@ -0,0 +1,62 @@
+# export_users.py
+"""
+Strumieniowy eksport bazy kandydatów do pliku NDJSON lub CSV (do analityki).
+
+Ten sam mechanizm co GET /users/export: kursor po stronie serwera, partie `yield_per`
+i relacje ładowane jednym zapytaniem na partię. Odczyt idzie przez silnik odczytu
+(replika, jeśli skonfigurowano DATABASE_READ_URL).
+
+Przykłady:
+    python export_users.py -o candidates.ndjson
+    python export_users.py --format csv --include skills,work_experiences -o candidates.csv
+    python export_users.py --skill Python --skill Django --project-id 3
+"""
+import argparse
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+from core.config import settings
+from core.database import AsyncReadSessionLocal, dispose_engines
+from core import export
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Eksportuje profile kandydatów do NDJSON lub CSV.")
+    parser.add_argument("--format", choices=export.EXPORT_FORMATS, default="ndjson")
+    parser.add_argument("-o", "--output", type=Path, default=None, help="Plik wynikowy (domyślnie stdout).")
+    parser.add_argument("--include", default=None,
+                        help=f"Relacje do dołączenia, oddzielone przecinkami: {', '.join(export.EXPORT_RELATIONS)} lub 'all'.")
+    parser.add_argument("--skill", action="append", default=[], help="Tylko profile z tą umiejętnością (można powtarzać).")
+    parser.add_argument("--project-id", type=int, default=None, help="Tylko kandydaci z danego projektu rekrutacyjnego.")
+    parser.add_argument("--batch-size", type=int, default=settings.EXPORT_BATCH_SIZE, help="Liczba profili na partię kursora.")
+    return parser.parse_args()
+
+
+async def main():
+    args = parse_args()
+    try:
+        relations = export.parse_relations(args.include)
+    except ValueError as e:
+        raise SystemExit(str(e))
+
+    out = open(args.output, "w", encoding="utf-8", newline="") if args.output else sys.stdout
+    start = time.perf_counter()
+    chunks = 0
+    try:
+        async with AsyncReadSessionLocal() as db:
+            async for chunk in export.stream_export(
+                db, args.format, relations, skills=args.skill, project_id=args.project_id, batch_size=args.batch_size
+            ):
+                out.write(chunk)
+                chunks += 1
+    finally:
+        if out is not sys.stdout:
+            out.close()
+        await dispose_engines()
+    print(f"Eksport zakończony: {chunks} partii w {time.perf_counter() - start:.1f}s.", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
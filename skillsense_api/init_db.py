@@ -1,7 +1,35 @@
 # init_db.py
 import asyncio
-from core.database import engine, Base
-from core import models  # Importujemy, aby SQLAlchemy "zobaczyło" nasze modele
+from sqlalchemy import text
+from core.database import engine, Base, dispose_engines
+from core import embedding_models, models  # Importujemy, aby SQLAlchemy "zobaczyło" nasze modele
+from core.config import settings
+from core.fts import install_fts_triggers
+
+# Kolumny dodane do istniejących tabel po pierwszym wdrożeniu - `create_all`
+# nie modyfikuje istniejących tabel, więc dodajemy je idempotentnie.
+COLUMN_MIGRATIONS = [
+    "ALTER TABLE users ADD COLUMN IF NOT EXISTS experience_months INTEGER",
+    "CREATE INDEX IF NOT EXISTS ix_users_experience_months ON users (experience_months)",
+    # Początek trwającego etatu - po dodaniu uruchom backfill_experience.py
+    "ALTER TABLE users ADD COLUMN IF NOT EXISTS experience_ongoing_since DATE",
+    "ALTER TABLE users ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP WITH TIME ZONE DEFAULT now()",
+    "CREATE INDEX IF NOT EXISTS ix_users_updated_at ON users (updated_at)",
+    # Kolumna robocza reembed.py --target shadow (model w tabeli embedding_models)
+    "ALTER TABLE users ADD COLUMN IF NOT EXISTS embedding_shadow vector(1536)",
+    "ALTER TABLE saved_searches ADD COLUMN IF NOT EXISTS query_embedding_model VARCHAR",
+]
+
+async def ensure_columns(conn):
+    for statement in COLUMN_MIGRATIONS:
+        await conn.execute(text(statement))
+
+async def ensure_embedding_models(conn):
+    """Wiersz z aktywnym modelem embeddingów - istniejące bazy mają wektory modelu z konfiguracji."""
+    await conn.execute(
+        text("INSERT INTO embedding_models (id, active_model) VALUES (:id, :model) ON CONFLICT (id) DO NOTHING"),
+        {"id": embedding_models.STATE_ID, "model": settings.EMBEDDING_MODEL},
+    )
 
 async def create_tables():
     """
@@ -15,9 +43,14 @@ async def create_tables():
         
         # Tworzy wszystkie tabele, które dziedziczą po Base
         await conn.run_sync(Base.metadata.create_all)
+        await ensure_columns(conn)
+        await ensure_embedding_models(conn)
+
+        # Funkcje i triggery utrzymujące ważony tsvector (idempotentne - także dla istniejących baz)
+        await install_fts_triggers(conn)
     
     print("Tabele zostały pomyślnie utworzone!")
-    await engine.dispose()
+    await dispose_engines()
 
 if __name__ == "__main__":
     asyncio.run(create_tables())
@@ -0,0 +1,237 @@
+# reembed.py
+"""
+Wsadowe, wznawialne przeliczenie embeddingów wszystkich profili.
+
+Używane po zmianie modelu embeddingów lub szablonu `build_embedding_text` - bez
+ponownego wgrywania CV. Tekst odtwarzany jest z zapisanych relacji, profile czytane
+strumieniowo (kursor po stronie serwera), embeddingi liczone partiami przez bramkę LLM
+(limit zapytań), a wyniki zapisywane zbiorczo. Postęp trafia do pliku checkpointu.
+
+Przykłady:
+    python reembed.py                              # nadpisuje `embedding` na miejscu
+    python reembed.py --target shadow --model text-embedding-3-small
+    python reembed.py --target shadow --model text-embedding-3-small --swap
+
+Zmiana modelu bez mieszania wektorów dwóch modeli (modele kolumn trzyma tabela
+`embedding_models`, patrz core/embedding_models.py) - przy działającym API, bez restartów:
+    1. `--target shadow --model X` zapisuje X jako `shadow_model` i przelicza `embedding_shadow`.
+       Od tej chwili workery liczą wgrywane CV oboma modelami (do obu kolumn).
+    2. `--target shadow --model X --swap` dopełnia brakujące wektory, a w jednej transakcji
+       zamienia kolumny i ustawia X jako `active_model`. Zapytania wektorowe sprawdzają model
+       w tej samej instrukcji, więc żaden worker nie porówna wektorów dwóch modeli; indeksy
+       w pamięci przeładowują się same.
+Przeliczenie na miejscu (`--target embedding`) jest możliwe tylko aktywnym modelem.
+"""
+import argparse
+import asyncio
+import json
+from datetime import datetime, timezone
+from pathlib import Path
+
+from sqlalchemy import bindparam, func, select, text, update
+from sqlalchemy.orm import raiseload, selectinload
+
+from core.config import settings
+from core.database import engine, AsyncSessionLocal, dispose_engines
+from core import embedding_models, models
+from core.llm_gateway import gateway
+from core.services import build_embedding_text
+
+users_table = models.User.__table__
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Przelicza embeddingi profili kandydatów.")
+    parser.add_argument("--target", choices=["embedding", "shadow"], default="embedding",
+                        help="'embedding' nadpisuje kolumnę na miejscu, 'shadow' zapisuje do embedding_shadow.")
+    parser.add_argument("--model", default=None, help="Model embeddingów (domyślnie aktywny model z bazy).")
+    parser.add_argument("--batch-size", type=int, default=100, help="Liczba tekstów w jednym wywołaniu API.")
+    parser.add_argument("--concurrency", type=int, default=4, help="Liczba równoległych wywołań API.")
+    parser.add_argument("--rpm", type=int, default=None, help="Limit zapytań na minutę dla modelu embeddingów.")
+    parser.add_argument("--checkpoint", type=Path, default=Path("reembed_checkpoint.json"))
+    parser.add_argument("--restart", action="store_true", help="Ignoruje istniejący checkpoint.")
+    parser.add_argument("--swap", action="store_true",
+                        help="(tylko --target shadow) dopełnia brakujące wektory i atomowo zamienia kolumny.")
+    parser.add_argument("--updated-since", type=datetime.fromisoformat, default=None,
+                        help="Tylko profile zmienione od podanego czasu (ISO 8601).")
+    return parser.parse_args()
+
+
+def load_checkpoint(path: Path, target: str, model: str) -> dict:
+    if path.exists():
+        state = json.loads(path.read_text())
+        if state.get("target") == target and state.get("model") == model:
+            return state
+        print(f"Checkpoint {path} dotyczy innego przebiegu ({state.get('target')}, {state.get('model')}) - zaczynam od początku.")
+    return {"target": target, "model": model, "last_id": 0, "processed": 0}
+
+
+def save_checkpoint(path: Path, state: dict):
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(json.dumps(state))
+    tmp.replace(path)  # Zapis atomowy - przerwanie w trakcie nie uszkodzi checkpointu
+
+
+async def ensure_shadow_column():
+    async with engine.begin() as conn:
+        await conn.execute(text("ALTER TABLE users ADD COLUMN IF NOT EXISTS embedding_shadow vector(1536)"))
+
+
+async def active_model() -> str:
+    async with AsyncSessionLocal() as db:
+        return (await embedding_models.current(db, refresh=True)).active
+
+
+async def begin_shadow(model: str):
+    """
+    Zapisuje `model` jako model `embedding_shadow`. Przy zmianie modelu czyści kolumnę - jej
+    zawartość (np. poprzednie wektory po --swap) pochodzi z innego modelu. Od commitu workery
+    liczą wgrywane CV także tym modelem.
+    """
+    async with engine.begin() as conn:
+        state = (await conn.execute(
+            text("SELECT active_model, shadow_model FROM embedding_models WHERE id = :id FOR UPDATE"),
+            {"id": embedding_models.STATE_ID},
+        )).first()
+        if state is None:
+            raise SystemExit("Brak wiersza w tabeli embedding_models - uruchom najpierw init_db.py.")
+        if state.active_model == model:
+            raise SystemExit(f"{model} jest już aktywnym modelem - użyj --target embedding.")
+        if state.shadow_model != model:
+            print(f"Rozpoczynam przeliczanie modelem {model} (poprzednio w embedding_shadow: {state.shadow_model}).")
+            await conn.execute(text("UPDATE embedding_models SET shadow_model = :model, updated_at = now() WHERE id = :id"),
+                               {"model": model, "id": embedding_models.STATE_ID})
+            await conn.execute(text("UPDATE users SET embedding_shadow = NULL WHERE embedding_shadow IS NOT NULL"))
+
+
+def build_update(target: str):
+    """UPDATE dla executemany: wektor do wybranej kolumny (tsvector utrzymują triggery w bazie)."""
+    stmt = update(users_table).where(users_table.c.id == bindparam("b_id"))
+    if target == "shadow":
+        # Profil zmieniony od odczytu (nowe CV) pomijamy - upload zapisał już jego
+        # embedding_shadow modelem przeliczania
+        return stmt.where(users_table.c.updated_at == bindparam("b_updated_at")).values(
+            embedding_shadow=bindparam("b_embedding"),
+            # Bez onupdate - zapis do kolumny roboczej nie jest zmianą profilu
+            updated_at=users_table.c.updated_at,
+        )
+    return stmt.values(
+        embedding=bindparam("b_embedding"),
+        updated_at=func.now(),  # Pozwala indeksowi wektorowemu w pamięci dociągnąć zmiany
+    )
+
+
+async def embed_chunk(users, batch_size: int, target: str, model: str):
+    texts = [build_embedding_text(u.ai_summary, u.work_experiences, u.projects, u.skills) for u in users]
+    batches = [texts[i:i + batch_size] for i in range(0, len(texts), batch_size)]
+    results = await asyncio.gather(*[gateway.aembed_documents(batch, model) for batch in batches])
+    vectors = [vector for batch in results for vector in batch]
+    if target == "shadow":
+        return [{"b_id": u.id, "b_updated_at": u.updated_at, "b_embedding": v} for u, v in zip(users, vectors)]
+    return [{"b_id": u.id, "b_embedding": v} for u, v in zip(users, vectors)]
+
+
+async def reembed(args, state: dict, only_missing_shadow: bool = False):
+    chunk_size = args.batch_size * args.concurrency
+    stmt = (
+        select(models.User)
+        .options(
+            raiseload("*"),
+            selectinload(models.User.work_experiences),
+            selectinload(models.User.projects),
+            selectinload(models.User.skills),
+        )
+        .where(models.User.id > state["last_id"])
+        .order_by(models.User.id)
+        .execution_options(yield_per=chunk_size)
+    )
+    if only_missing_shadow:
+        stmt = stmt.where(models.User.embedding_shadow.is_(None))
+    if args.updated_since is not None:
+        stmt = stmt.where(models.User.updated_at >= args.updated_since)
+    update_stmt = build_update(args.target)
+
+    # Obie sesje na primary: checkpoint i dopełnianie embedding_shadow nie mogą czytać opóźnionej repliki
+    async with AsyncSessionLocal() as read_db, AsyncSessionLocal() as write_db:
+        result = await read_db.stream(stmt)
+        async for partition in result.scalars().partitions(chunk_size):
+            rows = await embed_chunk(partition, args.batch_size, args.target, args.model)
+            await write_db.execute(update_stmt, rows)
+            await write_db.commit()
+            state["last_id"] = partition[-1].id
+            state["processed"] += len(partition)
+            if not only_missing_shadow:
+                save_checkpoint(args.checkpoint, state)
+            print(f"  Przetworzono {state['processed']} profili (ostatnie ID: {state['last_id']}).")
+
+
+async def swap_columns(model: str):
+    """
+    Atomowa zamiana kolumn (operacja na metadanych, bez przepisywania tabeli) razem ze zmianą
+    aktywnego modelu. FOR UPDATE czeka na trwające zapisy profili (FOR SHARE w uploadzie CV).
+    """
+    async with engine.begin() as conn:
+        state = (await conn.execute(
+            text("SELECT active_model, shadow_model FROM embedding_models WHERE id = :id FOR UPDATE"),
+            {"id": embedding_models.STATE_ID},
+        )).first()
+        if state is None or state.shadow_model != model:
+            raise RuntimeError(f"embedding_shadow nie jest przeliczana modelem {model} - uruchom najpierw --target shadow.")
+        missing = (await conn.execute(
+            text("SELECT count(*) FROM users WHERE embedding_shadow IS NULL AND embedding IS NOT NULL")
+        )).scalar_one()
+        if missing:
+            raise RuntimeError(f"{missing} profili nie ma jeszcze wektora w embedding_shadow - przerwano zamianę.")
+        await conn.execute(text("ALTER TABLE users RENAME COLUMN embedding TO embedding_previous"))
+        await conn.execute(text("ALTER TABLE users RENAME COLUMN embedding_shadow TO embedding"))
+        await conn.execute(text("ALTER TABLE users RENAME COLUMN embedding_previous TO embedding_shadow"))
+        # Poprzednie wektory nie są dalej utrzymywane - kolejne przeliczanie wyczyści kolumnę
+        await conn.execute(
+            text("UPDATE embedding_models SET active_model = :model, shadow_model = NULL, updated_at = now() WHERE id = :id"),
+            {"model": model, "id": embedding_models.STATE_ID},
+        )
+    swapped_at = datetime.now(timezone.utc).isoformat()
+    print(f"Zamieniono kolumny ({swapped_at}): aktywny model to {model}, poprzednie wektory są w `embedding_shadow`.")
+
+
+async def main():
+    args = parse_args()
+    current_model = await active_model()
+    args.model = args.model or current_model
+    if args.target == "embedding" and args.model != current_model:
+        # Nadpisanie na miejscu innym modelem mieszałoby wektory dwóch modeli w `embedding`
+        raise SystemExit(f"Aktywny model to {current_model} - zmiana modelu wymaga --target shadow (zob. opis modułu).")
+    if args.rpm:
+        settings.LLM_RATE_LIMITS_RPM[args.model] = args.rpm
+    # Bez --rpm obowiązuje LLM_RPM_EMBEDDINGS (core/llm_gateway.py), także dla modelu spoza konfiguracji
+
+    if args.target == "shadow":
+        await ensure_shadow_column()
+        await begin_shadow(args.model)
+
+    state = {"target": args.target, "model": args.model, "last_id": 0, "processed": 0}
+    if not args.restart:
+        state = load_checkpoint(args.checkpoint, args.target, args.model)
+
+    try:
+        if args.swap:
+            if args.target != "shadow":
+                raise SystemExit("--swap wymaga --target shadow.")
+            print("Dopełniam profile bez wektora w embedding_shadow...")
+            await reembed(args, {**state, "last_id": 0, "processed": 0}, only_missing_shadow=True)
+            await swap_columns(args.model)
+            args.checkpoint.unlink(missing_ok=True)
+        else:
+            print(f"Przeliczam embeddingi modelem {args.model} do kolumny '{args.target}' od ID > {state['last_id']}...")
+            await reembed(args, state)
+            # Kompletny przebieg nie zostawia checkpointu - ponowne uruchomienie (np. po zmianie
+            # szablonu `build_embedding_text`) przelicza wszystkie profile od początku
+            args.checkpoint.unlink(missing_ok=True)
+            print(f"Zakończono. Łącznie przetworzono {state['processed']} profili.")
+    finally:
+        await gateway.aclose()
+        await dispose_engines()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
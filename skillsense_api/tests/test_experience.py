@@ -0,0 +1,97 @@
+# tests/test_experience.py
+"""
+Odczyt dat z CV i wyliczanie doświadczenia zawodowego (core/experience.py):
+formaty dat, trwające etaty ("obecnie") i scalanie nakładających się okresów.
+"""
+from datetime import date
+
+import pytest
+
+from core.experience import (
+    effective_experience_months, experience_summary, month_index, parse_cv_date, total_experience_months,
+)
+
+TODAY = date(2024, 6, 15)
+
+
+def months(year: int, month: int) -> int:
+    return year * 12 + month - 1
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("2021-03", months(2021, 3)),
+    ("2021.03", months(2021, 3)),
+    ("03.2021", months(2021, 3)),
+    ("3/2021", months(2021, 3)),
+    ("marzec 2021", months(2021, 3)),
+    ("Mar 2021", months(2021, 3)),
+    ("październik 2019", months(2019, 10)),
+    ("2021", months(2021, 1)),
+])
+def test_parse_cv_date_formats(value, expected):
+    assert parse_cv_date(value, today=TODAY) == expected
+
+
+def test_parse_cv_date_year_only_end_is_december():
+    assert parse_cv_date("2021", is_end=True, today=TODAY) == months(2021, 12)
+
+
+@pytest.mark.parametrize("value", ["present", "Obecnie", "do dziś", "currently", "till now", None, ""])
+def test_parse_cv_date_present_end(value):
+    assert parse_cv_date(value, is_end=True, today=TODAY) == month_index(TODAY)
+
+
+@pytest.mark.parametrize("value", ["unknown", "n/a", "brak danych"])
+def test_parse_cv_date_unparseable(value):
+    # "unknown" zawiera "now" - nie może być odczytane jako trwający etat
+    assert parse_cv_date(value, is_end=True, today=TODAY) is None
+
+
+def test_missing_start_date_is_unknown():
+    assert parse_cv_date(None, today=TODAY) is None
+
+
+def test_total_experience_single_closed_period():
+    jobs = [{"start_date": "2020-01", "end_date": "2020-12"}]
+    assert total_experience_months(jobs, today=TODAY) == 12
+    assert experience_summary(jobs, today=TODAY) == (12, None)
+
+
+def test_overlapping_periods_are_not_counted_twice():
+    jobs = [
+        {"start_date": "2020-01", "end_date": "2020-12"},
+        {"start_date": "2020-07", "end_date": "2021-06"},  # równoległy etat
+        {"start_date": "2021-07", "end_date": "2021-09"},  # styka się z poprzednim
+        {"start_date": "2023-01", "end_date": "2023-03"},
+    ]
+    assert total_experience_months(jobs, today=TODAY) == 21 + 3
+
+
+def test_ongoing_role_grows_with_time():
+    jobs = [
+        {"start_date": "2020-01", "end_date": "2021-12"},
+        {"start_date": "2023-01", "end_date": "obecnie"},
+        {"start_date": "2023-06", "end_date": "2023-08"},  # zawiera się w trwającym etacie
+    ]
+    closed, ongoing_since = experience_summary(jobs, today=TODAY)
+    assert (closed, ongoing_since) == (24, date(2023, 1, 1))
+    assert total_experience_months(jobs, today=TODAY) == 24 + 18
+    # Zapisane raz wartości dają aktualny wynik także rok później
+    assert effective_experience_months(closed, ongoing_since, today=date(2025, 6, 1)) == 24 + 30
+
+
+def test_missing_end_date_is_treated_as_present():
+    assert experience_summary([{"start_date": "2024-01", "end_date": None}], today=TODAY) == (0, date(2024, 1, 1))
+
+
+def test_unparseable_periods_give_unknown_experience():
+    jobs = [{"start_date": "unknown", "end_date": "unknown"}, {"start_date": None}]
+    assert experience_summary(jobs, today=TODAY) == (None, None)
+    assert total_experience_months(jobs, today=TODAY) is None
+    assert effective_experience_months(None, None, today=TODAY) is None
+
+
+def test_orm_like_objects_are_accepted():
+    class Job:
+        start_date, end_date = "01.2022", "12.2022"
+    assert total_experience_months([Job()], today=TODAY) == 12